@@ -5,23 +5,22 @@ import json
 import random
 import os
 import datetime
-from neo4j import GraphDatabase
-from neo4j.exceptions import Neo4jError
+import hashlib
+import pickle
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 from collections import deque
 import sys
-import pandas as pd
-import json
 from collections import defaultdict
-from rich.text import Text
-from rich.layout import Layout
-from rich.panel import Panel
-from rich.align import Align
-from rich.bar import Bar
-from rich.console import Group
-from rich.table import Table
 from rich import print as print
 from collections import Counter
 
+# neo4j, numpy, scipy, sqlite3 y los componentes de rich se importan dentro de las funciones que los usan,
+# de modo que cada comando solo paga el coste de importación de lo que necesita
+
 # Definir los estados candidatos con sus probabilidades de ser absorbentes (finales)
 absorbent_probabilities = {
     'T1204': 0.42,
@@ -32,6 +31,146 @@ absorbent_probabilities = {
 
 current_scenario=""
 
+# Instrumentación por fases (--profile): tiempo, memoria (tracemalloc) y contadores de cada fase, anidables.
+# Desactivada, cada fase solo cuesta una comprobación; los contadores se atribuyen a la fase más interna.
+class PhaseProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.spans = []
+        self.stack = []
+        self.counters = Counter()
+        self.cprofile = None
+
+    def start(self, cprofile=False):
+        import tracemalloc
+        self.enabled = True
+        self.origin = time.time_ns()
+        # tracemalloc.reset_peak solo existe desde Python 3.9: antes, el pico de cada fase se aproxima con la
+        # memoria en uso en sus límites
+        self.reset_peak = getattr(tracemalloc, "reset_peak", None)
+        tracemalloc.start()
+        if cprofile:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    # Pico de memoria desde el último reinicio (o memoria en uso si no se puede reiniciar el pico)
+    def peak_memory(self):
+        import tracemalloc
+        current, peak = tracemalloc.get_traced_memory()
+        return peak if self.reset_peak is not None else current
+
+    def begin(self, name):
+        if not self.enabled:
+            return
+        import tracemalloc
+        current, _ = tracemalloc.get_traced_memory()
+        span = {"id": len(self.spans) + 1, "parent": self.stack[-1]["id"] if self.stack else None, "name": name,
+                "start": time.time_ns(), "end": None, "memory": current, "peak": 0, "counters": Counter()}
+        if self.stack:
+            self.stack[-1]["peak"] = max(self.stack[-1]["peak"], self.peak_memory())
+        if self.reset_peak is not None:
+            self.reset_peak()
+        self.spans.append(span)
+        self.stack.append(span)
+
+    def end(self):
+        if not self.enabled or not self.stack:
+            return
+        span = self.stack.pop()
+        span["end"] = time.time_ns()
+        span["peak"] = max(span["peak"], self.peak_memory()) - span["memory"]
+        if self.stack:
+            self.stack[-1]["peak"] = max(self.stack[-1]["peak"], span["peak"] + span["memory"])
+
+    @contextmanager
+    def phase(self, name):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] += amount
+            if self.stack:
+                self.stack[-1]["counters"][name] += amount
+
+    # Resumen por fases en la salida de error (no interfiere con la salida JSON) y volcado opcional a fichero
+    def report(self, output_file=None):
+        if not self.enabled:
+            return
+        from rich.console import Console
+        from rich.table import Table
+        while self.stack:
+            self.end()
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        total = max(time.time_ns() - self.origin, 1)
+
+        table = Table(title="Perfil de la ejecución por fases")
+        table.add_column("Fase")
+        table.add_column("Tiempo (ms)", justify="right")
+        table.add_column("%", justify="right")
+        table.add_column("Memoria pico (KiB)", justify="right")
+        table.add_column("Contadores")
+        depth = {None: -1}
+        for span in self.spans:
+            depth[span["id"]] = depth[span["parent"]] + 1
+            elapsed = span["end"] - span["start"]
+            table.add_row("  " * depth[span["id"]] + span["name"], f"{elapsed / 1e6:.1f}", f"{100 * elapsed / total:.1f}",
+                          f"{span['peak'] / 1024:,.0f}", ", ".join(f"{key}: {value}" for key, value in span["counters"].items()), style='cyan')
+        table.caption = f"Total {total / 1e6:.1f} ms · " + (", ".join(f"{key}: {value}" for key, value in self.counters.items()) or "sin contadores")
+        Console(stderr=True).print(table)
+
+        if output_file:
+            if output_file.endswith(".prof"):
+                if self.cprofile is not None:
+                    self.cprofile.dump_stats(output_file)
+            else:
+                with open(output_file, 'w', encoding='utf-8') as file:
+                    json.dump(self.trace(), file, ensure_ascii=False, indent=2)
+            Console(stderr=True).print(f"[green][+][reset] Perfil guardado en {output_file}.")
+
+    # Fases como trazas en el formato JSON de OpenTelemetry (OTLP)
+    def trace(self):
+        trace_id = uuid.uuid4().hex
+        def span_id(number):
+            return f"{number:016x}"
+        def attributes(values):
+            return [{"key": key, "value": {"intValue": str(value)}} for key, value in values.items()]
+        spans = [{
+            "traceId": trace_id,
+            "spanId": span_id(span["id"]),
+            "parentSpanId": span_id(span["parent"]) if span["parent"] else "",
+            "name": span["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(span["start"]),
+            "endTimeUnixNano": str(span["end"]),
+            "attributes": attributes({"memory.peak_bytes": span["peak"], **span["counters"]}),
+        } for span in self.spans]
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "argos"}},
+                                        {"key": "process.command_args", "value": {"stringValue": " ".join(sys.argv[1:])}}]},
+            "scopeSpans": [{"scope": {"name": "argos.profiler"}, "spans": spans}],
+        }]}
+
+profiler = PhaseProfiler()
+
+# Errores de la base de datos y de los escenarios: en la línea de comandos se muestran y terminan el proceso,
+# pero dentro de serve se propagan como excepción para responder a la petición sin detener el servicio
+class ArgosError(Exception):
+    pass
+
+serving = False
+
+def fail(message):
+    if serving:
+        raise ArgosError(message.strip())
+    print(f"\n[red][+][reset] {message}")
+    exit(1)
+
 # Función para cargar las transiciones desde el archivo CSV
 def load_transitions(csv_file):
     transitions = {}
@@ -69,14 +208,14 @@ def get_next_state(current_state, transitions):
         return None  # Si no hay transiciones definidas para el estado actual
 
 # Simular estado final
-def is_final_state(state):
+def is_final_state(state, rng=random):
     if state in absorbent_probabilities:
         # Usar la probabilidad específica de cada estado para decidir si debe ser absorbente
-        return random.random() < absorbent_probabilities[state]
+        return rng.random() < absorbent_probabilities[state]
     return False
 
 # Simular una secuencia de estados, deteniéndose en los estados absorbentes o en caso de ciclo reciente
-def simulate_chain(start_state, num_steps, transitions, max_recent=5):
+def simulate_chain(start_state, num_steps, model, max_recent=5, rng=random, verbose=True):
 
     state = start_state
     chain = [state]
@@ -86,19 +225,21 @@ def simulate_chain(start_state, num_steps, transitions, max_recent=5):
 
     for _ in range(num_steps):
         # Si alcanzamos un estado que, según su probabilidad, es absorbente, terminamos la secuencia
-        if is_final_state(state):
-            print(f"\n[yellow][+][reset] Estado absorbente alcanzado: {state}. Fin de la secuencia.\n")
+        if is_final_state(state, rng):
+            if verbose:
+                print(f"\n[yellow][+][reset] Estado absorbente alcanzado: {state}. Fin de la secuencia.\n")
             break
 
         # Detectar bucles recientes (si el estado ya está en los últimos visitados)
         if state in recently_visited:
-            print(f"[yellow][+][reset] Bucle detectado en el estado: {state}. Fin de la secuencia.\n")
+            if verbose:
+                print(f"[yellow][+][reset] Bucle detectado en el estado: {state}. Fin de la secuencia.\n")
             break
         
         recently_visited.append(state)  # Añadir estado a los recientes
         
         # Obtener el siguiente estado
-        next_s = get_next_state(state, transitions)
+        next_s = next_state(state, model, rng)
         if next_s is None:  # No hay más transiciones
             break
         chain.append(next_s)
@@ -107,13 +248,11 @@ def simulate_chain(start_state, num_steps, transitions, max_recent=5):
     return chain
 
 # Generar secuencia de estados mediante cadena de Markov
-def generate_markov_sequence(command, techniques):
+def generate_markov_sequence(command, knowledge_base):
     
-    # Cargar las transiciones desde el archivo CSV generado por el script anterior
-    transitions = load_transitions('transitions.csv')
-
-    # Verificar que las probabilidades sumen correctamente
-    verify_probabilities(transitions, is_percentage=True)  # Cambia a False si trabajas con decimales
+    # Transiciones del archivo CSV, ya verificadas y compiladas en la base de conocimiento
+    techniques = knowledge_base["techniques"]
+    transitions = knowledge_base["transitions"]
 
     # Seleccionar un estado inicial aleatorio de las claves disponibles en transitions
     if command == "attack":
@@ -128,7 +267,7 @@ def generate_markov_sequence(command, techniques):
         print("\n[blue][+][reset] Técnicas disponibles:\n")
         for i in range(0, len(available_states), num_columns):
             row = available_states[i:i+num_columns]
-            print(' | '.join(f"{state} - {techniques.get(state, {}).get('name', 'Desconocido'):<50}" for state in row))
+            print(' | '.join(f"{state} - {technique_name(techniques, state, 'Desconocido'):<50}" for state in row))
 
         start_state = input("\nIngrese el estado inicial: ") 
 
@@ -138,29 +277,1002 @@ def generate_markov_sequence(command, techniques):
     
     # Simulación de la cadena de Markov
     num_steps = 30  # Número de pasos máximo a simular
-    chain = simulate_chain(start_state, num_steps, transitions)
+    chain = simulate_chain(start_state, num_steps, knowledge_base["model"])
     print("[yellow][+][reset] Secuencia simulada de estados:", str(chain))
     print("\n")
     return chain
 
-def create_scenario_graph(driver, scenario_file):
+# Motivos de finalización de una cadena simulada (mismo orden de comprobación que simulate_chain)
+END_ABSORBENT = 0
+END_LOOP = 1
+END_DEAD_END = 2
+END_MAX_STEPS = 3
+END_REASONS = ["Estado absorbente", "Bucle detectado", "Sin transiciones", "Límite de pasos"]
+END_REASON_KEYS = ["absorbent", "loop", "dead_end", "max_steps"]  # Claves de la salida JSON
+
+# Compilar las transiciones: técnicas internadas como enteros, matriz CSR y tablas alias de Walker por estado
+def compile_transitions(transitions):
+    import numpy as np
+    from scipy import sparse
+    # Internar las técnicas como índices enteros (orígenes, destinos y estados absorbentes)
+    states = sorted(set(transitions) | {target for targets in transitions.values() for target, _ in targets} | set(absorbent_probabilities))
+    index = {state: i for i, state in enumerate(states)}
+
+    rows, columns, probabilities = [], [], []
+    for source, transitions_list in transitions.items():
+        weights = sum(prob for _, prob in transitions_list)
+        for target, prob in transitions_list:
+            rows.append(index[source])
+            columns.append(index[target])
+            probabilities.append(prob / weights)
+
+    matrix = sparse.csr_matrix((probabilities, (rows, columns)), shape=(len(states), len(states)))
+    matrix.sum_duplicates()
+    matrix.sort_indices()
+
+    # Tablas alias (método de Vose) alineadas con las entradas de la matriz CSR
+    alias_prob = np.ones(matrix.nnz, dtype=np.float64)
+    alias_target = matrix.indices.astype(np.int32)
+    for i in range(len(states)):
+        begin, end = matrix.indptr[i], matrix.indptr[i + 1]
+        degree = end - begin
+        if degree == 0:
+            continue
+        scaled = list(matrix.data[begin:end] * degree)
+        small = [k for k, p in enumerate(scaled) if p < 1.0]
+        large = [k for k, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            alias_prob[begin + s] = scaled[s]
+            alias_target[begin + s] = matrix.indices[begin + l]
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+
+    absorbent = np.zeros(len(states), dtype=np.float64)
+    for state, probability in absorbent_probabilities.items():
+        absorbent[index[state]] = probability
+
+    return {
+        "states": states,
+        "index": index,
+        "sources": np.array([index[s] for s in transitions], dtype=np.int32),
+        # Componentes CSR como arrays de NumPy: la caché se puede cargar sin importar scipy
+        "indptr": matrix.indptr,
+        "indices": matrix.indices,
+        "data": matrix.data,
+        "degree": np.diff(matrix.indptr).astype(np.int32),
+        "alias_prob": alias_prob,
+        "alias_target": alias_target,
+        "absorbent": absorbent,
+        # Copias como listas para el muestreo de una sola cadena sin coste de acceso a NumPy
+        "_alias": [
+            [(alias_prob[k], states[matrix.indices[k]], states[alias_target[k]]) for k in range(matrix.indptr[i], matrix.indptr[i + 1])]
+            for i in range(len(states))
+        ],
+    }
+
+# Matriz de transición dispersa (CSR) del modelo compilado
+def transition_matrix(model):
+    from scipy import sparse
+    size = len(model["states"])
+    return sparse.csr_matrix((model["data"], model["indices"], model["indptr"]), shape=(size, size))
+
+# Misma semántica que get_next_state sobre el modelo compilado: una extracción O(1) de la tabla alias
+def next_state(current_state, model, rng=random):
+    i = model["index"].get(current_state)
+    if i is None or not model["_alias"][i]:
+        return None  # Si no hay transiciones definidas para el estado actual
+    table = model["_alias"][i]
+    x = rng.random() * len(table)
+    k = int(x)
+    prob, target, alias = table[k]
+    return target if x - k < prob else alias
+
+# Muestrear el siguiente estado de muchas cadenas a la vez con las tablas alias
+def sample_next_states(current, model, rng):
+    import numpy as np
+    x = rng.random(len(current)) * model["degree"][current]
+    k = x.astype(np.int64)
+    slot = model["indptr"][current] + k
+    return np.where(x - k < model["alias_prob"][slot], model["indices"][slot], model["alias_target"][slot])
+
+# Simular 'runs' cadenas a la vez, avanzando todas las cadenas activas en cada paso
+def simulate_campaign(runs, model, rng, num_steps=30, max_recent=5):
+    import numpy as np
+    degree = model["degree"]
+    absorbent = model["absorbent"]
+
+    # Cadenas como matriz de índices rellenada con -1 a partir de su longitud
+    chains = np.full((runs, num_steps + 1), -1, dtype=np.int16)
+    lengths = np.ones(runs, dtype=np.int32)
+    end_reasons = np.full(runs, END_MAX_STEPS, dtype=np.int8)
+    # Últimos 'max_recent' estados de cada cadena, una fila por posición del buffer circular
+    recently_visited = np.full((max_recent, runs), -1, dtype=np.int16)
+
+    state = model["sources"][rng.integers(0, len(model["sources"]), size=runs)]
+    chains[:, 0] = state
+    active = np.arange(runs)
+
+    for step in range(num_steps):
+        current = state[active]
+
+        # Estados absorbentes según su probabilidad específica
+        absorbed = rng.random(len(active)) < absorbent[current]
+        # Bucles recientes (el estado ya está entre los últimos visitados)
+        looped = np.zeros(len(active), dtype=bool)
+        for recent in recently_visited[:min(step, max_recent)]:
+            looped |= recent[active] == current
+        looped &= ~absorbed
+        # Estados sin transiciones definidas
+        dead_end = ~absorbed & ~looped & (degree[current] == 0)
+
+        end_reasons[active[absorbed]] = END_ABSORBENT
+        end_reasons[active[looped]] = END_LOOP
+        end_reasons[active[dead_end]] = END_DEAD_END
+
+        keep = ~(absorbed | looped | dead_end)
+        active = active[keep]
+        current = current[keep]
+        if len(active) == 0:
+            break
+
+        recently_visited[step % max_recent, active] = current
+
+        # Obtener el siguiente estado de cada cadena con una extracción de su tabla alias
+        next_s = sample_next_states(current, model, rng)
+
+        chains[active, step + 1] = next_s
+        lengths[active] += 1
+        state[active] = next_s
+
+    return chains, lengths, end_reasons
+
+# Resolver de forma exacta la cadena absorbente: cada técnica es transitoria y, en cada visita, termina la
+# secuencia con su probabilidad absorbente o por falta de transiciones. Con Q = diag(1 - a)·P, la matriz
+# fundamental N = (I - Q)^-1 se usa solo a través de su factorización LU dispersa, sin invertirla.
+def solve_absorbing_chain(model):
+    import numpy as np
+    from scipy import sparse
+    from scipy.sparse import linalg as splinalg
+    matrix = transition_matrix(model)
+    absorbent = model["absorbent"]
+    size = len(model["states"])
+
+    q = sparse.diags(1.0 - absorbent) @ matrix
+    lu = splinalg.splu(sparse.csc_matrix(sparse.identity(size) - q))
+
+    # Probabilidad de terminar en cada estado absorbente o en una técnica sin transiciones (última columna)
+    outcomes = sorted(absorbent_probabilities)
+    r = np.zeros((size, len(outcomes) + 1), dtype=np.float64)
+    for k, state in enumerate(outcomes):
+        i = model["index"][state]
+        r[i, k] = absorbent[i]
+    dead_end = model["degree"] == 0
+    r[dead_end, -1] = 1.0 - absorbent[dead_end]
+
+    # Distribución inicial uniforme sobre los orígenes, como el comando attack
+    start = np.zeros(size, dtype=np.float64)
+    start[model["sources"]] = 1.0 / len(model["sources"])
+
+    return {
+        "lu": lu,
+        "outcomes": outcomes + ["Sin transiciones"],
+        # Longitud esperada de la secuencia (técnicas visitadas) desde cada técnica inicial: N·1
+        "expected_length": lu.solve(np.ones(size)),
+        # Probabilidades de absorción desde cada técnica inicial: N·R
+        "absorption": lu.solve(r),
+        # Visitas esperadas a cada técnica desde un inicio aleatorio: start·N
+        "visits": lu.solve(start, trans="T"),
+        "start": start,
+    }
+
+# Visitas esperadas a cada técnica partiendo de una técnica concreta (fila de N)
+def expected_visits_from(analysis, model, start_state):
+    import numpy as np
+    start = np.zeros(len(model["states"]), dtype=np.float64)
+    start[model["index"][start_state]] = 1.0
+    return analysis["lu"].solve(start, trans="T")
+
+def display_absorbing_analysis(model, analysis, techniques, start_state=None, top=10):
+    import numpy as np
+    from rich.table import Table
+    from rich.align import Align
+    states = model["states"]
+
+    if start_state is None:
+        start = analysis["start"]
+        visits = analysis["visits"]
+        title = "inicio aleatorio"
+    else:
+        start = np.zeros(len(states), dtype=np.float64)
+        start[model["index"][start_state]] = 1.0
+        visits = expected_visits_from(analysis, model, start_state)
+        title = start_state
+
+    expected_length = start @ analysis["expected_length"]
+    print(f"\n[green][+][reset] Análisis exacto de la cadena de Markov ({title}): {expected_length:.2f} técnicas esperadas por secuencia ({expected_length - 1:.2f} pasos).\n")
+
+    # Probabilidades de absorción
+    table = Table(title="Probabilidades de absorción")
+    table.add_column("Estado final")
+    table.add_column("Probabilidad", justify="right")
+    for outcome, probability in zip(analysis["outcomes"], start @ analysis["absorption"]):
+        table.add_row(outcome, f"{probability:.4f}", style='cyan')
+    print(Align.center(table))
+
+    # Visitas esperadas por técnica
+    table = Table(title="Visitas esperadas por técnica")
+    table.add_column("Técnica")
+    table.add_column("Nombre")
+    table.add_column("Visitas esperadas", justify="right")
+    for i in np.argsort(visits)[::-1][:top]:
+        table.add_row(states[i], technique_name(techniques, states[i], 'Desconocido'), f"{visits[i]:.4f}", style='cyan')
+    print(Align.center(table))
+
+    if start_state is None:
+        # Técnicas iniciales con secuencias esperadas más largas
+        table = Table(title="Pasos esperados hasta la absorción por técnica inicial")
+        table.add_column("Técnica inicial")
+        table.add_column("Pasos esperados", justify="right")
+        for outcome in analysis["outcomes"]:
+            table.add_column(outcome, justify="right")
+        sources = model["sources"]
+        for i in sources[np.argsort(analysis["expected_length"][sources])[::-1][:top]]:
+            table.add_row(states[i], f"{analysis['expected_length'][i] - 1:.2f}", *(f"{p:.3f}" for p in analysis["absorption"][i]), style='cyan')
+        print(Align.center(table))
+
+def run_analysis(start_state=None, top=10):
+    knowledge_base = load_knowledge_base()
+    techniques = knowledge_base["techniques"]
+    model = knowledge_base["model"]
+
+    if start_state is not None and start_state not in model["index"]:
+        print("\n[red][+][reset] El estado inicial no es válido. Por favor, elija una técnica válida.\n")
+        exit(0)
+
+    analysis = solve_absorbing_chain(model)
+    display_absorbing_analysis(model, analysis, techniques, start_state, top)
+
+# Coste (-log de la probabilidad) de cada transición u -> v en la cadena absorbente: la secuencia sigue en u
+# (1 - a(u)) y elige v con probabilidad P(u, v). Las aristas imposibles no se incluyen.
+def transition_costs(model):
+    import math
+    costs = []
+    for u in range(len(model["states"])):
+        edges = []
+        stay = 1.0 - model["absorbent"][u]
+        for k in range(model["indptr"][u], model["indptr"][u + 1]):
+            probability = stay * model["data"][k]
+            if probability > 0:
+                edges.append((int(model["indices"][k]), -math.log(probability)))
+        costs.append(edges)
+    return costs
+
+# Coste mínimo desde cada técnica hasta terminar absorbida en 'target' (Dijkstra sobre el grafo invertido).
+# Es una cota inferior del coste restante de cualquier camino sin repeticiones, y guía la búsqueda A*.
+def absorption_costs(model, costs, target):
+    import heapq
+    import math
+    reverse = [[] for _ in model["states"]]
+    for u, edges in enumerate(costs):
+        for v, cost in edges:
+            reverse[v].append((u, cost))
+
+    distance = [math.inf] * len(model["states"])
+    distance[target] = -math.log(model["absorbent"][target])
+    queue = [(distance[target], target)]
+    while queue:
+        d, v = heapq.heappop(queue)
+        if d > distance[v]:
+            continue
+        for u, cost in reverse[v]:
+            if d + cost < distance[u]:
+                distance[u] = d + cost
+                heapq.heappush(queue, (d + cost, u))
+    return distance
+
+# Los k caminos más probables que terminan absorbidos en cada estado absorbente, sin repetir técnicas (como
+# las cadenas simuladas, que se detienen al detectar un bucle) y con un máximo de 'max_steps' transiciones.
+# Búsqueda A* sobre caminos parciales con coste -log(probabilidad) y la heurística exacta del grafo sin
+# restricción de repeticiones: los caminos completos salen de la cola en orden de probabilidad decreciente,
+# por lo que los k primeros son exactamente los k más probables, sin muestreo.
+def most_probable_paths(model, start_state=None, targets=None, k=5, max_steps=30):
+    import heapq
+    import math
+    costs = transition_costs(model)
+    if start_state is not None:
+        starts = [(model["index"][start_state], 0.0)]
+    else:
+        # Inicio uniforme sobre las técnicas origen, como el comando attack
+        starts = [(int(i), math.log(len(model["sources"]))) for i in model["sources"]]
+
+    results = {}
+    for target in targets or sorted(absorbent_probabilities):
+        t = model["index"][target]
+        remaining = absorption_costs(model, costs, t)
+        absorb = -math.log(model["absorbent"][t])
+        found = []
+        queue = [(cost + remaining[i], cost, (i,)) for i, cost in starts if remaining[i] < math.inf]
+        heapq.heapify(queue)
+        while queue and len(found) < k:
+            _, cost, path = heapq.heappop(queue)
+            u = path[-1]
+            if u == t:
+                # Un camino sin repeticiones que llega a t solo puede terminar absorbido en t
+                found.append((math.exp(-(cost + absorb)), [model["states"][i] for i in path]))
+                continue
+            if len(path) > max_steps:
+                continue
+            for v, edge_cost in costs[u]:
+                if remaining[v] < math.inf and v not in path:
+                    heapq.heappush(queue, (cost + edge_cost + remaining[v], cost + edge_cost, path + (v,)))
+        results[target] = found
+    return results
+
+def display_paths(model, paths, analysis, start_state, elapsed):
+    import numpy as np
+    from rich.table import Table
+    from rich.align import Align
+
+    if start_state is None:
+        start = analysis["start"]
+        title = "inicio aleatorio"
+    else:
+        start = np.zeros(len(model["states"]), dtype=np.float64)
+        start[model["index"][start_state]] = 1.0
+        title = start_state
+    # Probabilidad total de terminar en cada destino, para ver qué parte cubren los caminos mostrados
+    absorption = dict(zip(analysis["outcomes"], start @ analysis["absorption"]))
+    print(f"\n[green][+][reset] Caminos más probables hasta cada estado absorbente ({title}), calculados en {1000 * elapsed:.1f} ms.\n")
+
+    table = Table(title="Caminos de ataque más probables")
+    table.add_column("Destino")
+    table.add_column("#", justify="right")
+    table.add_column("Probabilidad", justify="right")
+    table.add_column("% de la absorción", justify="right")
+    table.add_column("Secuencia")
+    for target, found in paths.items():
+        for rank, (probability, path) in enumerate(found, 1):
+            table.add_row(target if rank == 1 else "", str(rank),
+                          f"{probability:.5f}", f"{100 * probability / absorption[target]:.1f}" if absorption[target] > 0 else "-",
+                          " → ".join(path), style='cyan')
+        if not found:
+            table.add_row(target, "-", "-", "-", "Inalcanzable", style='cyan')
+        table.add_section()
+    print(Align.center(table))
+
+def run_paths(start_state=None, target=None, k=5, max_steps=30, output="report"):
+    knowledge_base = load_knowledge_base()
+    model = knowledge_base["model"]
+
+    if start_state is not None and start_state not in model["index"]:
+        print("\n[red][+][reset] El estado inicial no es válido. Por favor, elija una técnica válida.\n")
+        exit(0)
+    if target is not None and target not in absorbent_probabilities:
+        print(f"\n[red][+][reset] El destino debe ser un estado absorbente: {', '.join(sorted(absorbent_probabilities))}.\n")
+        exit(0)
+
+    start = time.perf_counter()
+    paths = most_probable_paths(model, start_state, [target] if target else None, k, max_steps)
+    elapsed = time.perf_counter() - start
+
+    if output == "json":
+        emit_json({
+            "start": start_state,
+            "elapsed_ms": round(1000 * elapsed, 3),
+            "paths": {target: [{"probability": probability, "steps": len(path) - 1, "sequence": path} for probability, path in found]
+                      for target, found in paths.items()},
+        })
+    else:
+        display_paths(model, paths, solve_absorbing_chain(model), start_state, elapsed)
+
+def create_scenario_graph(driver, scenario_file, batch_size=5000):
+    from neo4j.exceptions import Neo4jError
     global current_scenario
-    current_scenario=os.path.basename(scenario_file)[:-7]
-    guardar_escenario(current_scenario)
+    current_scenario=scenario_name(scenario_file)
+    guardar_escenario(scenario_file)
+
+    # Los escenarios se insertan por lotes; los .cypher se convierten antes a nodos y enlaces
+    if not scenario_file.endswith(".cypher"):
+        write_scenario_batches(driver, load_scenario_file(scenario_file), batch_size)
+        return
+
+    with open(scenario_file, 'r', encoding='utf-8') as file:
+        # Leer el contenido del archivo de escenario
+        query = file.read()
+    try:
+        write_scenario_batches(driver, parse_cypher_scenario(query), batch_size)
+        return
+    except ValueError as e:
+        print(f"\n[yellow][+][reset] El escenario usa Cypher no convertible ({e}); se ejecuta como una única consulta.")
+
     try:
         with driver.session() as session:
-            with open(scenario_file, 'r', encoding='utf-8') as file:
-                # Leer el contenido del archivo de escenario
-                query = file.read()
-                
-                # Ejecutar el contenido en Neo4j
-                session.run(query)
-                print(f"\n[green][+][reset] Escenario '{current_scenario}' insertado en Neo4j desde el fichero '{scenario_file}'.\n")
+            # Ejecutar el contenido en Neo4j
+            session.run(query)
+            print(f"\n[green][+][reset] Escenario '{current_scenario}' insertado en Neo4j desde el fichero '{scenario_file}'.\n")
     
     except Neo4jError as e:
-        print("\n[red][+][reset] Error connecting to Neo4j: " + f"{e}")
+        fail(f"Error connecting to Neo4j: {e}")
+
+# Restricciones e índices del esquema: MERGE/MATCH de técnicas por id y búsqueda de activos por nombre
+# (relaciones EXPLOTACIÓN) y por las propiedades que usa la correspondencia técnica-activo
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT tecnica_id IF NOT EXISTS FOR (t:Técnica) REQUIRE t.id IS UNIQUE",
+    "CREATE INDEX activo_name IF NOT EXISTS FOR (a:Activo) ON (a.name)",
+    "CREATE INDEX activo_platform IF NOT EXISTS FOR (a:Activo) ON (a.platform)",
+    "CREATE INDEX activo_permissions IF NOT EXISTS FOR (a:Activo) ON (a.permissions)",
+    "CREATE INDEX activo_capabilities IF NOT EXISTS FOR (a:Activo) ON (a.capabilities)",
+    "CREATE INDEX activo_cve IF NOT EXISTS FOR (a:Activo) ON (a.cve)",
+    # Las relaciones de cada ataque llevan su identificador y su escenario para consultarlas y borrarlas por separado
+    "CREATE INDEX transicion_ataque IF NOT EXISTS FOR ()-[r:TRANSICIÓN]-() ON (r.ataque)",
+    "CREATE INDEX transicion_escenario IF NOT EXISTS FOR ()-[r:TRANSICIÓN]-() ON (r.escenario)",
+    "CREATE INDEX explotacion_ataque IF NOT EXISTS FOR ()-[r:EXPLOTACIÓN]-() ON (r.ataque)",
+    "CREATE INDEX explotacion_escenario IF NOT EXISTS FOR ()-[r:EXPLOTACIÓN]-() ON (r.escenario)",
+]
+
+# Consultas de solo lectura equivalentes a las de un ataque, para comparar sus planes con PROFILE
+PROFILE_QUERIES = [
+    ("Explotación (técnica y activo por clave)", """
+        PROFILE UNWIND $hits AS h
+        MATCH (t:Técnica {id: h.tecnica})
+        MATCH (a:Activo {name: h.activo})
+        RETURN count(*)
+    """),
+    ("Activos por plataforma", """
+        PROFILE MATCH (a:Activo)
+        WHERE a.platform IN $platforms
+        RETURN count(a)
+    """),
+]
+
+def create_schema(driver):
+    from neo4j.exceptions import Neo4jError
+    try:
+        with driver.session() as session:
+            for statement in SCHEMA_STATEMENTS:
+                session.run(statement).consume()
+            # Esperar a que los índices estén disponibles antes de usarlos
+            session.run("CALL db.awaitIndexes(300)").consume()
+        print(f"[green][+][reset] Esquema de Neo4j preparado: {len(SCHEMA_STATEMENTS)} restricciones e índices.\n")
+
+    except Neo4jError as e:
+        fail(f"Error connecting to Neo4j: {e}")
+
+# Sumar los accesos a la base de datos (db hits) y listar los operadores de un plan PROFILE
+def plan_db_hits(plan):
+    return plan.get("dbHits", 0) + sum(plan_db_hits(child) for child in plan.get("children", []))
+
+def plan_operators(plan):
+    operator = plan.get("operatorType", "?").split("@")[0]
+    operators = [] if operator == "ProduceResults" else [operator]
+    for child in plan.get("children", []):
+        operators.extend(plan_operators(child))
+    return operators
+
+# Perfilar las consultas de correspondencia con los parámetros de un escenario: {consulta: (db hits, operadores)}
+def profile_matching_queries(driver, parameters):
+    from neo4j.exceptions import Neo4jError
+    profiles = {}
+    try:
+        with driver.session() as session:
+            for name, query in PROFILE_QUERIES:
+                plan = session.run(query, **parameters).consume().profile or {}
+                profiles[name] = (plan_db_hits(plan), plan_operators(plan))
+    except Neo4jError as e:
+        fail(f"Error connecting to Neo4j: {e}")
+    return profiles
+
+# Parámetros representativos para el perfilado: todas las parejas técnica-activo del escenario cargado
+def profile_parameters(driver):
+    knowledge_base = load_knowledge_base()
+    asset_index = build_asset_index(load_scenario_assets(driver))
+    matches = match_campaign_assets(asset_index, knowledge_base["model"]["states"], knowledge_base["techniques"], knowledge_base["cves"])
+    hits = [{"tecnica": state, "activo": asset_index["names"][position]} for state, positions in matches.items() for position in positions]
+    return {"hits": hits, "platforms": sorted(asset_index["platform"])}
+
+def display_profile_comparison(before, after):
+    from rich.table import Table
+    from rich.align import Align
+    table = Table(title="Plan de las consultas de correspondencia (PROFILE)")
+    table.add_column("Consulta")
+    table.add_column("DB hits antes", justify="right")
+    table.add_column("DB hits después", justify="right")
+    table.add_column("Operadores antes")
+    table.add_column("Operadores después")
+    for name in before:
+        table.add_row(name, str(before[name][0]), str(after[name][0]), " > ".join(before[name][1]), " > ".join(after[name][1]), style='cyan')
+    print(Align.center(table))
+
+# Tokens del subconjunto de Cypher usado en los escenarios (CREATE de nodos y relaciones)
+CYPHER_TOKEN = re.compile(r"""
+    (?P<space>\s+|//[^\n]*)
+  | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<number>-?\d+(?:\.\d+)?(?![\w.]))
+  | (?P<name>[^\W\d]\w*|`[^`]+`)
+  | (?P<symbol>[()\[\]{}:,;<>-])
+""", re.VERBOSE)
+
+def tokenize_cypher(text):
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = CYPHER_TOKEN.match(text, position)
+        if match is None:
+            raise ValueError(f"carácter inesperado '{text[position]}' en la posición {position}")
+        position = match.end()
+        if match.lastgroup != "space":
+            tokens.append((match.lastgroup, match.group()))
+    return tokens
+
+# Analizar un fichero de escenario .cypher (cláusulas CREATE) y construir el grafo en memoria
+def parse_cypher_scenario(text):
+    tokens = tokenize_cypher(text)
+    graph = {"nodes": [], "links": []}
+    variables = {}
+    position = 0
+
+    def peek(offset=0):
+        return tokens[position + offset][1] if position + offset < len(tokens) else None
+
+    def expect(value):
+        nonlocal position
+        if peek() != value:
+            raise ValueError(f"se esperaba '{value}' y se encontró '{peek()}'")
+        position += 1
+
+    def value():
+        nonlocal position
+        kind, token = tokens[position]
+        position += 1
+        if kind == "string":
+            return re.sub(r"\\(.)", lambda m: {"n": "\n", "t": "\t"}.get(m.group(1), m.group(1)), token[1:-1])
+        if kind == "number":
+            return float(token) if "." in token else int(token)
+        if kind == "name" and token.lower() in ("true", "false", "null"):
+            return {"true": True, "false": False, "null": None}[token.lower()]
+        if token == "[":
+            items = []
+            while peek() != "]":
+                items.append(value())
+                if peek() == ",":
+                    expect(",")
+            expect("]")
+            return items
+        raise ValueError(f"valor no soportado '{token}'")
+
+    def properties():
+        nonlocal position
+        props = {}
+        if peek() != "{":
+            return props
+        expect("{")
+        while peek() != "}":
+            key = tokens[position][1].strip("`")
+            position += 1
+            expect(":")
+            props[key] = value()
+            if peek() == ",":
+                expect(",")
+        expect("}")
+        return props
+
+    def node():
+        nonlocal position
+        expect("(")
+        variable = None
+        labels = []
+        if tokens[position][0] == "name":
+            variable = tokens[position][1]
+            position += 1
+        while peek() == ":":
+            expect(":")
+            labels.append(tokens[position][1].strip("`"))
+            position += 1
+        props = properties()
+        expect(")")
+        if variable in variables and not labels and not props:
+            return variables[variable]
+        graph["nodes"].append({"labels": labels, "properties": props})
+        if variable is not None:
+            variables[variable] = len(graph["nodes"]) - 1
+        return len(graph["nodes"]) - 1
+
+    def relationship():
+        nonlocal position
+        incoming = peek() == "<"
+        if incoming:
+            expect("<")
+        expect("-")
+        expect("[")
+        if tokens[position][0] == "name":
+            position += 1
+        expect(":")
+        rel_type = tokens[position][1].strip("`")
+        position += 1
+        props = properties()
+        expect("]")
+        expect("-")
+        if not incoming:
+            expect(">")
+        return rel_type, props, incoming
+
+    while position < len(tokens):
+        if peek() == ";":
+            expect(";")
+            continue
+        if peek().upper() != "CREATE":
+            raise ValueError(f"cláusula no soportada '{peek()}' (solo se admite CREATE)")
+        position += 1
+        while True:
+            source = node()
+            while peek() in ("-", "<"):
+                rel_type, props, incoming = relationship()
+                target = node()
+                origin, destination = (target, source) if incoming else (source, target)
+                graph["links"].append({"source": origin, "target": destination, "type": rel_type, "properties": props})
+                source = target
+            if peek() != ",":
+                break
+            expect(",")
+
+    return graph
+
+def load_cypher_scenario(scenario_file):
+    try:
+        with open(scenario_file, 'r', encoding='utf-8') as file:
+            return parse_cypher_scenario(file.read())
+
+    except FileNotFoundError:
+        fail(f"No se ha encontrado el escenario '{scenario_file}'.\n")
+
+    except ValueError as e:
+        fail(f"Error al analizar el escenario '{scenario_file}': {e}\n")
+
+# Escenario estructurado en JSON: {"name", "assets": [{"name", "labels", propiedades...}],
+# "links": [{"source", "target", "type", "properties"}]}, con los extremos de los enlaces por nombre de activo
+def load_json_scenario(scenario_file):
+    try:
+        with open(scenario_file, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+    except FileNotFoundError:
+        fail(f"No se ha encontrado el escenario '{scenario_file}'.\n")
+    except json.JSONDecodeError as e:
+        fail(f"Error al analizar el escenario '{scenario_file}': {e}\n")
+
+    return structured_to_graph(data, scenario_file)
+
+# Nodos y enlaces (por posición) a partir de activos y enlaces (por nombre)
+def structured_to_graph(data, scenario_file):
+    nodes, positions = [], {}
+    for asset in data.get("assets", []):
+        properties = {key: value for key, value in asset.items() if key != "labels"}
+        positions[properties.get("name")] = len(nodes)
+        nodes.append({"labels": ["Activo"] + [label for label in asset.get("labels", []) if label != "Activo"], "properties": properties})
+
+    links = []
+    for link in data.get("links", []):
+        if link["source"] not in positions or link["target"] not in positions:
+            fail(f"Error al analizar el escenario '{scenario_file}': enlace entre activos desconocidos {link['source']} -> {link['target']}.\n")
+        links.append({"source": positions[link["source"]], "target": positions[link["target"]],
+                      "type": link["type"], "properties": link.get("properties", {})})
+    return {"nodes": nodes, "links": links}
+
+# Escenario en CSV: un fichero de activos (columnas name, labels, ip, platform, permissions, capabilities, cve y
+# cualquier otra propiedad) y, opcionalmente, un fichero <nombre>.links.csv con las columnas source, target y
+# type; el resto de columnas de los enlaces son sus propiedades. Las listas se separan con ';'.
+CSV_LIST_COLUMNS = ["labels", "permissions", "capabilities", "cve"]
+CSV_LINKS_SUFFIX = ".links.csv"
+
+def csv_value(value):
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+def load_csv_scenario(scenario_file):
+    def read_rows(csv_file):
+        try:
+            with open(csv_file, 'r', newline='', encoding='utf-8') as file:
+                return list(csv.DictReader(file))
+        except FileNotFoundError:
+            fail(f"No se ha encontrado el escenario '{csv_file}'.\n")
+
+    assets = []
+    for row in read_rows(scenario_file):
+        asset = {}
+        for column, value in row.items():
+            if value in (None, ""):
+                continue
+            asset[column] = [item.strip() for item in value.split(";") if item.strip()] if column in CSV_LIST_COLUMNS else csv_value(value)
+        assets.append(asset)
+
+    links = []
+    links_file = scenario_file[:-len(".csv")] + CSV_LINKS_SUFFIX
+    if os.path.isfile(links_file):
+        for row in read_rows(links_file):
+            links.append({"source": row.pop("source"), "target": row.pop("target"), "type": row.pop("type"),
+                          "properties": {column: csv_value(value) for column, value in row.items() if value not in (None, "")}})
+    return structured_to_graph({"assets": assets, "links": links}, scenario_file)
+
+SCENARIO_FORMATS = {".cypher": load_cypher_scenario, ".json": load_json_scenario, ".csv": load_csv_scenario}
+
+def is_scenario_file(path):
+    return os.path.splitext(path)[1] in SCENARIO_FORMATS and not path.endswith(CSV_LINKS_SUFFIX)
+
+# Convertir nodos y enlaces (por posición) al formato estructurado (activos y enlaces por nombre)
+def graph_to_structured(graph, name):
+    names = []
+    for node in graph["nodes"]:
+        if node["properties"].get("name") is None:
+            raise ValueError(f"nodo sin nombre con etiquetas {':'.join(node['labels'])}")
+        names.append(node["properties"]["name"])
+    if len(set(names)) != len(names):
+        raise ValueError("hay activos con el mismo nombre")
+
+    assets = [{"name": node["properties"]["name"], "labels": [label for label in node["labels"] if label != "Activo"],
+               **{key: value for key, value in node["properties"].items() if key != "name"}} for node in graph["nodes"]]
+    links = [{"source": names[link["source"]], "target": names[link["target"]], "type": link["type"], "properties": link["properties"]}
+             for link in graph["links"]]
+    return {"name": name, "assets": assets, "links": links}
+
+def write_csv_scenario(scenario, scenario_file):
+    def write_rows(csv_file, fixed, rows):
+        columns = fixed + sorted({column for row in rows for column in row} - set(fixed))
+        with open(csv_file, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=columns)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({column: ";".join(value) if isinstance(value, list) else value for column, value in row.items()})
+
+    write_rows(scenario_file, ["name"] + CSV_LIST_COLUMNS[:1] + ["ip", "platform"] + CSV_LIST_COLUMNS[1:], scenario["assets"])
+    if scenario["links"]:
+        write_rows(scenario_file[:-len(".csv")] + CSV_LINKS_SUFFIX, ["source", "target", "type"],
+                   [{"source": link["source"], "target": link["target"], "type": link["type"], **link["properties"]} for link in scenario["links"]])
+
+# Convertir un escenario entre formatos (por ejemplo, de .cypher a .json o .csv) según las extensiones
+def convert_scenario(source_file, target_file):
+    graph = load_scenario_file(source_file)
+    try:
+        scenario = graph_to_structured(graph, os.path.splitext(os.path.basename(target_file))[0])
+    except ValueError as e:
+        fail(f"No se puede convertir el escenario '{source_file}': {e}.\n")
+
+    if target_file.endswith(".json"):
+        with open(target_file, 'w', encoding='utf-8') as file:
+            json.dump(scenario, file, ensure_ascii=False, indent=2)
+    elif target_file.endswith(".csv"):
+        write_csv_scenario(scenario, target_file)
+    else:
+        fail(f"Formato de destino no soportado: '{target_file}' (extensiones: .json, .csv).\n")
+    print(f"\n[green][+][reset] Escenario '{source_file}' convertido a '{target_file}': {len(scenario['assets'])} activos y {len(scenario['links'])} enlaces.\n")
+
+# Cargar un escenario en memoria (nodos y enlaces) según la extensión de su fichero
+def load_scenario_file(scenario_file):
+    loader = SCENARIO_FORMATS.get(os.path.splitext(scenario_file)[1])
+    if loader is None:
+        fail(f"Formato de escenario no soportado: '{scenario_file}' (extensiones: {', '.join(SCENARIO_FORMATS)}).\n")
+    return loader(scenario_file)
+
+# Localizar en el directorio scenarios el fichero de un escenario a partir de su nombre
+def find_scenario_file(name):
+    if os.path.isfile(name):
+        return name
+    for extension in SCENARIO_FORMATS:
+        scenario_file = os.path.join("scenarios", f"{name}{extension}")
+        if os.path.isfile(scenario_file):
+            return scenario_file
+    return os.path.join("scenarios", f"{name}.cypher")
+
+# Nombre de un escenario a partir de su nombre o de la ruta de su fichero
+def scenario_name(scenario):
+    return os.path.splitext(os.path.basename(scenario))[0]
+
+# Etiqueta o tipo de relación como identificador de Cypher
+def cypher_name(name):
+    return "`" + name.replace("`", "``") + "`"
+
+# Insertar un escenario en Neo4j con consultas UNWIND por lotes de 'batch_size' elementos, una transacción por
+# lote. Los nodos se agrupan por etiquetas y las relaciones por tipo, que no pueden pasarse como parámetros; las
+# relaciones se enlazan por el identificador interno de los nodos recién creados. Un lote fallido se reintenta
+# una vez y, si vuelve a fallar, se anota y la carga continúa (las relaciones de sus nodos se omiten); la carga
+# se interrumpe si fallan 'max_failures' lotes seguidos.
+def write_scenario_batches(driver, graph, batch_size=5000, max_failures=3):
+    from neo4j.exceptions import Neo4jError, DriverError
+    from rich.progress import Progress, BarColumn, MofNCompleteColumn, TextColumn, TimeElapsedColumn
+    nodes, links = graph["nodes"], graph["links"]
+    node_ids = [None] * len(nodes)
+    batch_size = max(1, batch_size)
+
+    # Lotes de nodos (consulta, filas, descripción); las relaciones se insertan después de todos los nodos
+    node_groups = defaultdict(list)
+    for position, node in enumerate(nodes):
+        node_groups[tuple(node["labels"])].append(position)
+    node_batches = []
+    for labels, positions in node_groups.items():
+        query = f"""
+            UNWIND $rows AS row
+            CREATE (n{''.join(':' + cypher_name(label) for label in labels)})
+            SET n = row.props
+            RETURN row.position AS position, id(n) AS id
+        """
+        for i in range(0, len(positions), batch_size):
+            node_batches.append((query, [{"position": position, "props": nodes[position]["properties"]} for position in positions[i:i + batch_size]],
+                                 f"{':'.join(labels)}, lote {i // batch_size + 1}"))
+
+    link_groups = defaultdict(list)
+    for link in links:
+        link_groups[link["type"]].append(link)
+
+    failures = []
+    consecutive = 0
+    transactions = 0
+    created_nodes = created_links = 0
+
+    def run_batch(session, query, rows, description):
+        nonlocal consecutive, transactions
+        for attempt in range(2):
+            try:
+                with session.begin_transaction() as tx:
+                    records = [record.data() for record in tx.run(query, rows=rows)]
+                    tx.commit()
+                transactions += 1
+                profiler.count("consultas")
+                profiler.count("elementos escritos", len(rows))
+                consecutive = 0
+                return records
+            except (Neo4jError, DriverError) as e:
+                error = e
+        failures.append((description, len(rows), str(error).splitlines()[0] if str(error) else type(error).__name__))
+        consecutive += 1
+        if consecutive >= max_failures:
+            print(f"\n[red][+][reset] Carga interrumpida tras {consecutive} lotes fallidos seguidos: {failures[-1][2]}\n")
+            exit(1)
+        return None
+
+    start = time.perf_counter()
+    with Progress(TextColumn("{task.description}"), BarColumn(), MofNCompleteColumn(), TimeElapsedColumn(), TextColumn("{task.fields[rate]}"), transient=True) as progress:
+        task = progress.add_task("Insertando escenario", total=len(nodes) + len(links), rate="")
+        with driver.session() as session:
+            for query, rows, description in node_batches:
+                records = run_batch(session, query, rows, description)
+                for record in records or []:
+                    node_ids[record["position"]] = record["id"]
+                created_nodes += len(records or [])
+                progress.update(task, advance=len(rows), rate=f"{(created_nodes + created_links) / max(time.perf_counter() - start, 1e-9):,.0f} elementos/s")
+
+            for link_type, group in link_groups.items():
+                query = f"""
+                    UNWIND $rows AS row
+                    MATCH (a) WHERE id(a) = row.source
+                    MATCH (b) WHERE id(b) = row.target
+                    CREATE (a)-[r:{cypher_name(link_type)}]->(b)
+                    SET r = row.props
+                """
+                for i in range(0, len(group), batch_size):
+                    batch = group[i:i + batch_size]
+                    rows = [{"source": node_ids[link["source"]], "target": node_ids[link["target"]], "props": link["properties"]}
+                            for link in batch if node_ids[link["source"]] is not None and node_ids[link["target"]] is not None]
+                    if len(rows) < len(batch):
+                        failures.append((f"{link_type}, lote {i // batch_size + 1}", len(batch) - len(rows), "extremos en lotes de nodos fallidos"))
+                    if rows and run_batch(session, query, rows, f"{link_type}, lote {i // batch_size + 1}") is not None:
+                        created_links += len(rows)
+                    progress.update(task, advance=len(batch), rate=f"{(created_nodes + created_links) / max(time.perf_counter() - start, 1e-9):,.0f} elementos/s")
+
+    elapsed = time.perf_counter() - start
+    print(f"\n[green][+][reset] Escenario '{current_scenario}' insertado en Neo4j: {created_nodes} nodos y {created_links} relaciones en {transactions} transacciones de hasta {batch_size} elementos ({elapsed:.2f} s, {(created_nodes + created_links) / max(elapsed, 1e-9):,.0f} elementos/s).\n")
+
+    if failures:
+        from rich.table import Table
+        table = Table(title="Lotes no insertados")
+        table.add_column("Lote")
+        table.add_column("Elementos", justify="right")
+        table.add_column("Error")
+        for description, count, error in failures:
+            table.add_row(description, str(count), error, style='red')
+        print(table)
         exit(1)
 
+# Tipos de activo del generador: proporción, plataformas candidatas y si tienen propiedades explotables
+SYNTHETIC_ASSETS = [
+    ("Usuario", 0.20, []),
+    ("DispositivoRed", 0.50, ["Windows", "Linux", "macOS"]),
+    ("Servidor", 0.15, ["Windows", "Linux", "IaaS", "Containers"]),
+    ("Aplicacion", 0.10, ["Linux", "Windows", "SaaS", "Office 365", "Google Workspace", "Containers"]),
+    ("DispositivoSeguridad", 0.05, ["Network"]),
+]
+
+SYNTHETIC_PROTOCOLS = ["SMB", "LDAP", "HTTP", "HTTPS", "SSH", "RDP", "SMTP"]
+
+# Generar un escenario sintético de 'num_assets' activos. Plataformas, permisos y capacidades se extraen con
+# la frecuencia con la que aparecen en las técnicas (tecnicas_completo.json) y los CVE con la frecuencia con
+# la que se asocian a técnicas (ttp_cwe_cve.json), de modo que la correspondencia se comporta como en un
+# escenario real. Cada activo tiene en media 'links' conexiones y 'capabilities' capacidades.
+def generate_scenario(num_assets, seed=None, links=2, capabilities=3, cve_ratio=0.1, name="sintetico"):
+    import numpy as np
+    knowledge_base = load_knowledge_base()
+    techniques = knowledge_base["techniques"]
+    rng = np.random.default_rng(seed)
+
+    platform_freq, permission_freq, capability_freq = Counter(), Counter(), Counter()
+    for state in techniques:
+        platforms, permissions, requirements = get_match_filters(state, techniques)
+        platform_freq.update(platforms)
+        permission_freq.update(permissions)
+        capability_freq.update(requirements)
+    cve_freq = Counter(cve for cves in knowledge_base["cves"].values() for cve in cves)
+
+    def sampler(frequencies):
+        values = sorted(frequencies)
+        weights = np.array([frequencies[value] for value in values], dtype=float)
+        return values, weights / weights.sum()
+
+    permission_values, permission_p = sampler(permission_freq)
+    capability_values, capability_p = sampler(capability_freq)
+    cve_values, cve_p = sampler(cve_freq)
+
+    # Atributos de todos los activos extraídos de una vez; las capacidades se eligen sin reemplazo por
+    # muestreo ponderado con claves exponenciales (las 'count' claves menores de cada fila)
+    kinds = rng.choice(len(SYNTHETIC_ASSETS), size=num_assets, p=[share for _, share, _ in SYNTHETIC_ASSETS])
+    platform_draws = {}
+    for kind, (_, _, platforms) in enumerate(SYNTHETIC_ASSETS):
+        if platforms:
+            platform_values, platform_p = sampler({platform: platform_freq[platform] for platform in platforms})
+            platform_draws[kind] = iter([platform_values[j] for j in rng.choice(len(platform_values), size=num_assets, p=platform_p)])
+    permission_draws = rng.choice(len(permission_values), size=num_assets, p=permission_p)
+    capability_counts = np.minimum(rng.poisson(capabilities, size=num_assets), len(capability_values))
+    capability_order = np.argsort(rng.exponential(size=(num_assets, len(capability_values))) / capability_p, axis=1)
+    cve_draws = rng.choice(len(cve_values), size=(num_assets, 3), p=cve_p)
+    cve_counts = np.where(rng.random(num_assets) < cve_ratio, rng.integers(1, 4, size=num_assets), 0)
+
+    assets, by_kind = [], defaultdict(list)
+    for i, kind in enumerate(kinds.tolist()):
+        label = SYNTHETIC_ASSETS[kind][0]
+        asset = {"name": f"{label}-{i + 1}", "labels": [label]}
+        if kind in platform_draws:
+            asset["ip"] = f"10.{(i + 1) >> 16 & 255}.{(i + 1) >> 8 & 255}.{(i + 1) & 255}"
+            asset["platform"] = next(platform_draws[kind])
+            asset["permissions"] = [permission_values[permission_draws[i]]]
+            asset["capabilities"] = [capability_values[j] for j in capability_order[i, :capability_counts[i]]]
+            if cve_counts[i]:
+                asset["cve"] = list(dict.fromkeys(cve_values[j] for j in cve_draws[i, :cve_counts[i]]))
+        by_kind[label].append(asset["name"])
+        assets.append(asset)
+
+    # Topología: usuarios que se autentican en equipos, equipos y servidores conectados entre sí,
+    # aplicaciones alojadas en servidores y dispositivos de seguridad que protegen servidores
+    scenario_links = []
+    def pick(label, size):
+        return [by_kind[label][j] for j in rng.integers(0, len(by_kind[label]), size=size)] if by_kind[label] else []
+
+    for user, device in zip(by_kind["Usuario"], pick("DispositivoRed", len(by_kind["Usuario"]))):
+        scenario_links.append({"source": user, "target": device, "type": "AUTENTICACION", "properties": {}})
+    hosts = by_kind["DispositivoRed"] + by_kind["Servidor"]
+    for host in hosts:
+        for target in set(pick("Servidor", rng.poisson(links))) - {host}:
+            scenario_links.append({"source": host, "target": target, "type": "CONEXION",
+                                   "properties": {"protocolo": SYNTHETIC_PROTOCOLS[rng.integers(len(SYNTHETIC_PROTOCOLS))]}})
+    for application, server in zip(by_kind["Aplicacion"], pick("Servidor", len(by_kind["Aplicacion"]))):
+        scenario_links.append({"source": application, "target": server, "type": "ALOJAMIENTO", "properties": {"entorno": server}})
+    for device in by_kind["DispositivoSeguridad"]:
+        for server in set(pick("Servidor", max(1, rng.poisson(links)))):
+            scenario_links.append({"source": device, "target": server, "type": "PROTECCION", "properties": {"tipo": "Firewall"}})
+
+    return {
+        "name": name,
+        "generator": {"assets": num_assets, "seed": seed, "links": links, "capabilities": capabilities, "cve_ratio": cve_ratio},
+        "assets": assets,
+        "links": scenario_links,
+    }
+
+def write_generated_scenario(scenario_file, num_assets, seed=None, links=2, capabilities=3, cve_ratio=0.1):
+    start = time.perf_counter()
+    name = os.path.splitext(os.path.basename(scenario_file))[0]
+    scenario = generate_scenario(num_assets, seed, links, capabilities, cve_ratio, name)
+    with open(scenario_file, 'w', encoding='utf-8') as file:
+        json.dump(scenario, file, ensure_ascii=False)
+    print(f"\n[green][+][reset] Escenario sintético '{name}' generado en '{scenario_file}': {len(scenario['assets'])} activos y {len(scenario['links'])} enlaces ({time.perf_counter() - start:.2f} s).\n")
+
 def load_cwes_json(json_file):
     
     with open(json_file, 'r') as file:
@@ -193,24 +1305,79 @@ def load_cves_json(json_file):
     # Convertimos sets a listas para el resultado final
     return {ttp: list(cves) for ttp, cves in ttp_to_cves.items()}
 
-# Función para cargar el mapeo de técnicas a activos desde el archivo JSON
-def load_techniques_json(json_file):
+# Convertir un atributo de técnica a lista para almacenarlo en el nodo
+def as_list(value):
+    if isinstance(value, str):
+        return [value]
+    elif value is None:
+        return []
+    return value
+
+# Separar por comas los valores de un atributo ("Linux, Windows") para la correspondencia con activos
+def split_values(value):
+    return tuple(sys.intern(item.strip()) for values in as_list(value) for item in values.split(","))
+
+# Técnica normalizada una única vez al compilar la base de conocimiento: los filtros de correspondencia y las
+# propiedades del nodo (con sus CWEs y CVEs) quedan precalculados, de modo que simular, escribir el ataque o
+# buscar activos no vuelve a convertir ni separar cadenas en cada paso de cada cadena.
+class Technique:
+    __slots__ = ("id", "name", "tactic", "platforms", "defenses_bypassed", "permissions_required",
+                 "system_requirements", "effective_permissions", "cwes", "cves",
+                 "match_platforms", "match_permissions", "match_requirements", "properties")
+
+    def __init__(self, technique_id, entry, cves=(), cwes=()):
+        self.id = technique_id
+        self.name = entry.get("name", "Desconocido")
+        self.tactic = entry.get("tactics", "Desconocido")
+        self.platforms = entry.get("platforms", "Desconocido")
+        self.defenses_bypassed = entry.get("defenses bypassed", "Desconocido")
+        self.permissions_required = entry.get("permissions required", "Desconocido")
+        self.system_requirements = entry.get("system requirements", "Desconocido")
+        self.effective_permissions = entry.get("effective permissions", "Desconocido")
+        self.cwes = tuple(cwes)
+        self.cves = tuple(cves)
+
+        self.match_platforms = split_values(self.platforms)
+        self.match_permissions = split_values(self.permissions_required)
+        self.match_requirements = split_values(self.system_requirements)
+        self.properties = {
+            "name": self.name,
+            "platforms": as_list(self.platforms),
+            "permissions_required": as_list(self.permissions_required),
+            "system_requirements": as_list(self.system_requirements),
+            "CWEs": list(self.cwes),
+            "CVEs": list(self.cves),
+        }
+
+    # Atributos como tupla, para guardar la base de conocimiento sin referencias a la clase: así la caché no
+    # depende de si argos se ejecuta como programa (__main__) o se importa como módulo (argos)
+    def values(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    @classmethod
+    def from_values(cls, values):
+        technique = cls.__new__(cls)
+        for slot, value in zip(cls.__slots__, values):
+            setattr(technique, slot, value)
+        return technique
+
+# Función para cargar el mapeo de técnicas a activos desde el archivo JSON, adjuntando a cada técnica sus CVEs y CWEs
+def load_techniques_json(json_file, cves=None, cwes=None):
+    cves = cves or {}
+    cwes = cwes or {}
     techniques = {}
     with open(json_file, 'r', encoding='utf-8') as file:
         data = json.load(file)
         for entry in data:
             technique_id = entry["ID"]
-            techniques[technique_id] = {
-                "name": entry.get("name", "Desconocido"),
-                "tactic": entry.get("tactics", "Desconocido"),
-                "platforms": entry.get("platforms", "Desconocido"),
-                "defenses_bypassed": entry.get("defenses bypassed", "Desconocido"),
-                "permissions_required": entry.get("permissions required", "Desconocido"),
-                "system_requirements": entry.get("system requirements", "Desconocido"),
-                "effective_permissions": entry.get("effective permissions", "Desconocido")
-            }
+            techniques[technique_id] = Technique(technique_id, entry, cves.get(technique_id, ()), cwes.get(technique_id, ()))
     return techniques
 
+# Nombre de una técnica, o 'default' si no figura en la base de conocimiento
+def technique_name(techniques, state, default=None):
+    technique = techniques.get(state)
+    return technique.name if technique is not None else default
+
 def load_mitigations_json(json_file):
     mitigations = {}
     with open(json_file, "r") as file:
@@ -222,177 +1389,1199 @@ def load_mitigations_json(json_file):
                 mitigations[target_id] = source_name
     return mitigations
 
-def create_attack_graph(driver, chain, techniques, cves, cwes):
+# Técnicas que cubre cada mitigación: {id de la mitigación: (nombre, [técnicas])}
+def load_mitigation_targets_json(json_file):
+    with open(json_file, "r") as file:
+        data = json.load(file)
+    return {item["source ID"]: (item["source name"], list(item["target ID"])) for item in data}
+
+# Ficheros fuente de la base de conocimiento compilada y ubicación de la caché
+KB_SOURCES = ['tecnicas_completo.json', 'ttp_cwe_cve.json', 'ttp_mitigations.json', 'transitions.csv']
+KB_CACHE = os.path.join('.argos_cache', 'knowledge_base.pickle')
+KB_VERSION = 5  # Incrementar al cambiar el formato de la base de conocimiento
+
+_knowledge_base = None
+
+# Huella de los ficheros fuente: la caché solo es válida si coincide
+def knowledge_base_key():
+    digests = []
+    for source in KB_SOURCES:
+        with open(source, 'rb') as file:
+            digests.append((source, hashlib.sha256(file.read()).hexdigest()))
+    return (KB_VERSION, tuple(digests))
+
+# Compilar técnicas, mapas CWE/CVE, mitigaciones y transiciones en un único fichero binario
+def compile_knowledge_base(key=None):
+    transitions = load_transitions('transitions.csv')
+    verify_probabilities(transitions, is_percentage=True)
+    cves = load_cves_json('ttp_cwe_cve.json')
+    cwes = load_cwes_json('ttp_cwe_cve.json')
+
+    knowledge_base = {
+        "key": key or knowledge_base_key(),
+        "techniques": load_techniques_json('tecnicas_completo.json', cves, cwes),
+        "cves": cves,
+        "cwes": cwes,
+        "mitigations": load_mitigations_json('ttp_mitigations.json'),
+        "mitigation_targets": load_mitigation_targets_json('ttp_mitigations.json'),
+        "transitions": transitions,
+        "model": compile_transitions(transitions),
+    }
+
+    # Las técnicas se guardan como tuplas y se reconstruyen al cargar (Technique.from_values)
+    cached = dict(knowledge_base, techniques={state: technique.values() for state, technique in knowledge_base["techniques"].items()})
+    os.makedirs(os.path.dirname(KB_CACHE), exist_ok=True)
+    temporary = KB_CACHE + '.tmp'
+    with open(temporary, 'wb') as file:
+        pickle.dump(cached, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, KB_CACHE)
+    return knowledge_base
+
+# Cargar la base de conocimiento desde la caché, recompilándola si los ficheros fuente han cambiado
+def load_knowledge_base():
+    global _knowledge_base
+    if _knowledge_base is not None:
+        return _knowledge_base
+
+    with profiler.phase("base de conocimiento"):
+        key = knowledge_base_key()
+        try:
+            with open(KB_CACHE, 'rb') as file:
+                knowledge_base = pickle.load(file)
+            if knowledge_base.get("key") != key:
+                knowledge_base = compile_knowledge_base(key)
+            else:
+                knowledge_base["techniques"] = {state: Technique.from_values(values) for state, values in knowledge_base["techniques"].items()}
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            knowledge_base = compile_knowledge_base(key)
+
+    _knowledge_base = knowledge_base
+    return knowledge_base
+
+# Propiedades de un nodo Técnica (el nodo se identifica solo por su id)
+def technique_properties(state, techniques, cves, cwes):
+    technique = techniques.get(state)
+    if technique is not None:
+        return technique.properties
+    return {
+        "name": None,
+        "platforms": [],
+        "permissions_required": [],
+        "system_requirements": [],
+        "CWEs": cwes.get(state, []),  # Si no hay datos, devuelve una lista vacía
+        "CVEs": cves.get(state, []),
+    }
+
+# Escribir un conjunto de transiciones (de una o muchas cadenas) con una única consulta en una transacción explícita.
+# Los nodos Técnica se comparten entre ataques; cada relación TRANSICIÓN pertenece a un ataque (su clave en el
+# MERGE), de modo que las transiciones de ataques distintos no se fusionan y se pueden borrar por separado.
+def write_attack_edges(driver, edges, techniques, cves, cwes, attack_id, scenario, timing=False):
+    from neo4j.exceptions import Neo4jError
+    edges = list(dict.fromkeys(edges))  # Transiciones distintas, conservando el orden
+    states = list(dict.fromkeys(state for edge in edges for state in edge))
+    nodes = [{"id": state, "props": technique_properties(state, techniques, cves, cwes)} for state in states]
+    rows = [{"origen": origin, "destino": destination} for origin, destination in edges]
+
+    start = time.perf_counter()
     try:
         with driver.session() as session:
-            for i in range(len(chain) - 1):
-                origin_state = chain[i]
-                destination_state = chain[i + 1]
-                
-                # Obtener la información de la técnica para los atributos necesarios
-                origin_technique_info = techniques.get(origin_state, {})
-                dest_technique_info = techniques.get(destination_state, {})
-
-                # Convertir atributos a listas si no lo son
-                origin_platforms = origin_technique_info.get("platforms")
-                if isinstance(origin_platforms, str):
-                    origin_platforms = [origin_platforms]
-                elif origin_platforms is None:
-                    origin_platforms = []
-                
-                origin_permissions = origin_technique_info.get("permissions_required")
-                if isinstance(origin_permissions, str):
-                    origin_permissions = [origin_permissions]
-                elif origin_permissions is None:
-                    origin_permissions = []
-                
-                origin_requirements = origin_technique_info.get("system_requirements")
-                if isinstance(origin_requirements, str):
-                    origin_requirements = [origin_requirements]
-                elif origin_requirements is None:
-                    origin_requirements = []
-
-                origin_name = origin_technique_info.get("name")
-
-                # Extraer CWEs y CVEs para esa TTP
-                origin_cwes = cwes.get(origin_state, [])  # Si no hay datos, devuelve una lista vacía
-                origin_cves = cves.get(origin_state, [])
-
-                # Repetir el mismo proceso para el destino
-                dest_platforms = dest_technique_info.get("platforms")
-                if isinstance(dest_platforms, str):
-                    dest_platforms = [dest_platforms]
-                elif dest_platforms is None:
-                    dest_platforms = []
-
-                dest_permissions = dest_technique_info.get("permissions_required")
-                if isinstance(dest_permissions, str):
-                    dest_permissions = [dest_permissions]
-                elif dest_permissions is None:
-                    dest_permissions = []
-
-                dest_requirements = dest_technique_info.get("system_requirements")
-                if isinstance(dest_requirements, str):
-                    dest_requirements = [dest_requirements]
-                elif dest_requirements is None:
-                    dest_requirements = []
-
-                dest_name = dest_technique_info.get("name")
-
-                # Extraer CWEs y CVEs para esa TTP
-                dest_cwes = cwes.get(destination_state, [])  # Si no hay datos, devuelve una lista vacía
-                dest_cves = cves.get(destination_state, [])
-
-                # Crear nodos de estado con atributos completos
-                session.run("""
-                    MERGE (t1:Técnica {
-                        id: $estado_origen,
-                        name: $name_origen,
-                        platforms: $platforms_origen,
-                        permissions_required: $permissions_origen,
-                        system_requirements: $requirements_origen,
-                        CWEs: $cwes_origen,
-                        CVEs: $cves_origen
-                    })
-                    MERGE (t2:Técnica {
-                        id: $estado_destino,
-                        name: $name_destino,
-                        platforms: $platforms_destino,
-                        permissions_required: $permissions_destino,
-                        system_requirements: $requirements_destino,
-                        CWEs: $cwes_destino,
-                        CVEs: $cves_destino
-                    })
-                    MERGE (t1)-[:TRANSICIÓN]->(t2)
-                """, 
-                estado_origen=origin_state, name_origen=origin_name, platforms_origen=origin_platforms,
-                permissions_origen=origin_permissions, requirements_origen=origin_requirements,
-                estado_destino=destination_state, name_destino=dest_name, platforms_destino=dest_platforms,
-                permissions_destino=dest_permissions, requirements_destino=dest_requirements,
-                cwes_origen=origin_cwes, cves_origen=origin_cves, cwes_destino=dest_cwes, cves_destino=dest_cves)
-
-            print("[green][+][reset] Secuencia de ataque insertada en Neo4j.\n")
+            with session.begin_transaction() as tx:
+                tx.run("""
+                    UNWIND $tecnicas AS tecnica
+                    MERGE (t:Técnica {id: tecnica.id})
+                    SET t += tecnica.props
+                    WITH count(*) AS _
+                    UNWIND $edges AS e
+                    MATCH (t1:Técnica {id: e.origen})
+                    MATCH (t2:Técnica {id: e.destino})
+                    MERGE (t1)-[r:TRANSICIÓN {ataque: $ataque}]->(t2)
+                    SET r.escenario = $escenario
+                """, tecnicas=nodes, edges=rows, ataque=attack_id, escenario=str(scenario)).consume()
+                tx.commit()
+        profiler.count("consultas")
+        profiler.count("transiciones escritas", len(rows))
 
     except Neo4jError as e:
-        print("\n[red][+][reset] Error connecting to Neo4j: " + f"{e}")
-        exit(1)
+        fail(f"Error connecting to Neo4j: {e}")
+
+    if timing:
+        print(f"[blue][+][reset] Escritura del ataque: {len(rows)} transiciones y {len(nodes)} técnicas en 1 consulta ({1000 * (time.perf_counter() - start):.1f} ms).\n")
+
+def create_attack_graph(backend, chain, techniques, cves, cwes, attack_id, timing=False):
+    if len(chain) < 2:
+        return
+    with profiler.phase("escritura del ataque"):
+        backend.write_attack_edges(list(zip(chain, chain[1:])), techniques, cves, cwes, attack_id, current_scenario or cargar_escenario(), timing)
+    if backend.name == "neo4j":
+        print("[green][+][reset] Secuencia de ataque insertada en Neo4j.\n")
+
+# Obtener plataformas, permisos y requisitos de una técnica (ya separados al compilar la base de conocimiento)
+def get_match_filters(state, techniques):
+    technique = techniques.get(state)
+    if technique is None:
+        return (), (), ()
+    return technique.match_platforms, technique.match_permissions, technique.match_requirements
+
+# Cargar una única vez los activos del escenario desde Neo4j
+def load_scenario_assets(driver):
+    from neo4j.exceptions import Neo4jError
+    try:
+        with driver.session() as session:
+            result = session.run("""
+                MATCH (a:Activo)
+                RETURN a.name AS name, a.platform AS platform, a.permissions AS permissions,
+                       a.capabilities AS capabilities, a.cve AS cve
+            """)
+            assets = [record.data() for record in result]
+        profiler.count("consultas")
+        profiler.count("registros leídos", len(assets))
+        return assets
+
+    except Neo4jError as e:
+        fail(f"Error connecting to Neo4j: {e}")
+
+# Cargar los enlaces entre activos del escenario (conectividad para el movimiento lateral)
+def load_scenario_links(driver):
+    from neo4j.exceptions import Neo4jError
+    try:
+        with driver.session() as session:
+            result = session.run("""
+                MATCH (a:Activo)-->(b:Activo)
+                RETURN a.name AS source, b.name AS target
+            """)
+            links = [(record["source"], record["target"]) for record in result]
+        profiler.count("consultas")
+        profiler.count("registros leídos", len(links))
+        return links
+
+    except Neo4jError as e:
+        fail(f"Error connecting to Neo4j: {e}")
+
+# Índice en memoria de los activos: plataforma, permiso, capacidad y CVE -> posiciones de los activos
+def build_asset_index(assets):
+    index = {
+        "names": [asset.get("name") for asset in assets],
+        "platform": defaultdict(set),
+        "permission": defaultdict(set),
+        "capability": defaultdict(set),
+        "cve": defaultdict(set),
+    }
+    for position, asset in enumerate(assets):
+        if asset.get("platform") is not None:
+            index["platform"][asset["platform"]].add(position)
+        for permission in as_list(asset.get("permissions")):
+            index["permission"][permission].add(position)
+        for capability in as_list(asset.get("capabilities")):
+            index["capability"][capability].add(position)
+        for cve in as_list(asset.get("cve")):
+            index["cve"][cve].add(position)
+    return index
+
+# Activos que puede explotar una técnica: plataforma compatible y (algún permiso o alguna capacidad requerida), o algún CVE
+def match_technique_assets(asset_index, state, techniques, cves):
+    platforms, permissions, requirements = get_match_filters(state, techniques)
+
+    def lookup(key, values):
+        found = set()
+        for value in values:
+            found |= asset_index[key].get(value, set())
+        return found
+
+    matched = lookup("platform", platforms) & (lookup("permission", permissions) | lookup("capability", requirements))
+    matched |= lookup("cve", cves.get(state, []))
+    return sorted(matched)
+
+# Crear todas las relaciones EXPLOTACIÓN de un ataque con una única consulta
+def write_exploitation_edges(driver, hits, attack_id, scenario):
+    from neo4j.exceptions import Neo4jError
+    rows = [{"tecnica": technique_id, "activo": asset} for asset, technique_id in dict.fromkeys(hits)]
+    try:
+        with driver.session() as session:
+            with session.begin_transaction() as tx:
+                tx.run("""
+                    UNWIND $hits AS h
+                    MATCH (t:Técnica {id: h.tecnica})
+                    MATCH (a:Activo {name: h.activo})
+                    MERGE (t)-[r:EXPLOTACIÓN {ataque: $ataque}]->(a)
+                    SET r.escenario = $escenario
+                """, hits=rows, ataque=attack_id, escenario=str(scenario)).consume()
+                tx.commit()
+        profiler.count("consultas")
+        profiler.count("explotaciones escritas", len(rows))
+
+    except Neo4jError as e:
+        fail(f"Error connecting to Neo4j: {e}")
 
-def link_attack_to_scenario(driver, chain, techniques, cves, cwes):
+def link_attack_to_scenario(backend, chain, techniques, cves, cwes, attack_id, seed=None, lateral=False, entry=None):
     
+    knowledge_base = load_knowledge_base()
+    with profiler.phase("carga de activos"):
+        exposure = load_exposure_matrix(backend, knowledge_base)
+        total_assets = len(exposure["names"])
+
+    with profiler.phase("correspondencia"):
+        try:
+            if lateral:
+                affected_assets, affecting_techniques_ids, affecting_techniques_names = lateral_attack_assets(exposure, chain, knowledge_base["model"], techniques, entry)
+            else:
+                affected_assets, affecting_techniques_ids, affecting_techniques_names = exposed_attack_assets(exposure, chain, knowledge_base["model"], techniques)
+        except ValueError as e:
+            print(f"\n[red][+][reset] {e}.\n")
+            exit(1)
+    with profiler.phase("escritura de explotaciones"):
+        backend.write_exploitation_edges(list(zip(affected_assets, affecting_techniques_ids)), attack_id, current_scenario or cargar_escenario())
+
+    #Crear dashboard del ataque
+    create_dashboard(affected_assets, affecting_techniques_ids, affecting_techniques_names, total_assets, chain, attack_id, seed)
+
+# Obtener los activos que puede explotar cada técnica a partir del índice del escenario (sin modificar el grafo)
+def match_campaign_assets(asset_index, states, techniques, cves):
+    return {state: match_technique_assets(asset_index, state, techniques, cves) for state in states}
+
+EXPOSURE_DIR = os.path.join('.argos_cache', 'exposure')
+EXPOSURE_VERSION = 2  # Incrementar al cambiar el formato de la matriz guardada
+
+# Matriz de exposición del escenario: una fila de bits por técnica del modelo (y una fila final vacía para el
+# relleno -1 de las cadenas) con los activos que puede explotar. Solo depende de la base de conocimiento y de
+# los activos, por lo que se calcula una vez por escenario y los activos comprometidos por una cadena son el
+# OR de sus filas. Junto a ella se guarda la adyacencia de los activos para el movimiento lateral.
+def build_exposure_matrix(assets, knowledge_base, links=()):
+    import numpy as np
+    model = knowledge_base["model"]
+    asset_index = build_asset_index(assets)
+    words = max(1, (len(assets) + 63) // 64)
+
+    masks = np.zeros((len(model["states"]) + 1, words), dtype=np.uint64)
+    match_counts = np.zeros(len(model["states"]) + 1, dtype=np.int64)
+    for row, state in enumerate(model["states"]):
+        positions = np.array(match_technique_assets(asset_index, state, knowledge_base["techniques"], knowledge_base["cves"]), dtype=np.int64)
+        match_counts[row] = len(positions)
+        np.bitwise_or.at(masks[row], positions // 64, np.left_shift(np.uint64(1), (positions % 64).astype(np.uint64)))
+
+    return {"names": asset_index["names"], "masks": masks, "match_counts": match_counts,
+            "adjacency": build_adjacency(asset_index["names"], links)}
+
+# Adyacencia no dirigida de los activos en formato CSR (indptr, indices): los vecinos del activo i son
+# indices[indptr[i]:indptr[i + 1]]. Un enlace en cualquier sentido permite moverse entre ambos activos.
+def build_adjacency(names, links):
+    import numpy as np
+    positions = {name: i for i, name in enumerate(names)}
+    pairs = np.array([(positions[source], positions[target]) for source, target in links
+                      if source in positions and target in positions and source != target], dtype=np.int64).reshape(-1, 2)
+    edges = np.unique(np.concatenate([pairs, pairs[:, ::-1]]) @ np.array([len(names), 1]))
+    sources, targets = edges // max(len(names), 1), edges % max(len(names), 1)
+    indptr = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=len(names)), out=indptr[1:])
+    return {"indptr": indptr, "indices": targets.astype(np.int32)}
+
+# Posiciones de los activos expuestos a la técnica de una fila de la matriz
+def exposed_positions(exposure, row):
+    import numpy as np
+    return np.flatnonzero(np.unpackbits(exposure["masks"][row].view(np.uint8), bitorder="little")).tolist()
+
+# Huella de los activos del escenario: la matriz guardada solo es válida si coincide
+def assets_fingerprint(assets):
+    return hashlib.sha256(pickle.dumps(assets, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+# Fichero de la matriz en caché: nombre del escenario y huella de la ruta absoluta de su fichero, para que dos
+# escenarios con el mismo nombre en directorios distintos no compartan caché
+def exposure_cache_file(scenario_file):
+    digest = hashlib.sha256(os.path.abspath(scenario_file).encode()).hexdigest()[:12]
+    return os.path.join(EXPOSURE_DIR, f"{scenario_name(scenario_file)}-{digest}.pickle")
+
+# Obtener la matriz de exposición del escenario desde .argos_cache, recalculándola y guardándola si la base
+# de conocimiento o los activos han cambiado. Los enlaces solo se leen al recalcularla (siempre en prepare).
+# Por defecto, el escenario es el fichero del backend sin base de datos o el último preparado.
+def load_exposure_matrix(backend, knowledge_base, scenario_file=None, rebuild=False):
+    import tempfile
+    assets = backend.load_assets()
+    key = (EXPOSURE_VERSION, knowledge_base["key"], assets_fingerprint(assets))
+    exposure_file = exposure_cache_file(scenario_file or getattr(backend, "scenario_file", None) or cargar_fichero_escenario())
+    if not rebuild:
+        try:
+            with open(exposure_file, 'rb') as file:
+                exposure = pickle.load(file)
+            if exposure.get("key") == key:
+                return exposure
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            pass
+
+    exposure = build_exposure_matrix(assets, knowledge_base, backend.load_links())
+    exposure["key"] = key
+    os.makedirs(EXPOSURE_DIR, exist_ok=True)
+    # Fichero temporal propio de cada proceso: varios procesos pueden recalcular a la vez la misma matriz
+    with tempfile.NamedTemporaryFile(dir=EXPOSURE_DIR, suffix='.tmp', delete=False) as file:
+        pickle.dump(exposure, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(file.name, exposure_file)
+    return exposure
+
+# Activos comprometidos por cada técnica de la cadena, en el orden de la secuencia, a partir de la matriz
+def exposed_attack_assets(exposure, chain, model, techniques):
     affected_assets = []
     affecting_techniques_ids = []
     affecting_techniques_names = []
-    total_assets = []
 
+    for state in chain:
+        name = technique_name(techniques, state)
+        for position in exposed_positions(exposure, model["index"][state]):
+            affected_assets.append(exposure["names"][position])
+            affecting_techniques_ids.append(state)
+            affecting_techniques_names.append(name)
+
+    return affected_assets, affecting_techniques_ids, affecting_techniques_names
+
+# Activos comprometidos por cada técnica de la cadena propagando el compromiso por la topología del escenario:
+# cada técnica solo alcanza los activos ya comprometidos y sus vecinos (y el activo de entrada). Sin activo de
+# entrada, la primera técnica con éxito actúa como acceso inicial sobre cualquier activo expuesto. La frontera
+# se amplía solo con los vecinos de los activos recién comprometidos.
+def lateral_attack_assets(exposure, chain, model, techniques, entry=None):
+    import numpy as np
+    names = exposure["names"]
+    indptr, indices = exposure["adjacency"]["indptr"], exposure["adjacency"]["indices"]
+    reachable = np.zeros(len(names), dtype=bool)
+    compromised = np.zeros(len(names), dtype=bool)
+    if entry is not None:
+        if entry not in names:
+            raise ValueError(f"El activo de entrada {entry} no existe en el escenario")
+        reachable[names.index(entry)] = True
+
+    affected_assets = []
+    affecting_techniques_ids = []
+    affecting_techniques_names = []
+    for state in chain:
+        exposed = np.unpackbits(exposure["masks"][model["index"][state]].view(np.uint8), bitorder="little")[:len(names)].astype(bool)
+        hits = np.flatnonzero(exposed & reachable) if compromised.any() or entry is not None else np.flatnonzero(exposed)
+        if len(hits) == 0:
+            continue
+
+        name = technique_name(techniques, state)
+        for position in hits:
+            affected_assets.append(names[position])
+            affecting_techniques_ids.append(state)
+            affecting_techniques_names.append(name)
+
+        new = hits[~compromised[hits]]
+        compromised[new] = True
+        reachable[new] = True
+        for position in new:
+            reachable[indices[indptr[position]:indptr[position + 1]]] = True
+
+    return affected_assets, affecting_techniques_ids, affecting_techniques_names
+
+# Gravedad de un ataque (0-100): mitad por la proporción de activos afectados y mitad por la proporción de
+# técnicas distintas entre todas las explotaciones
+def attack_severity(affected_count, total_assets, successful_count, hits_count):
+    return min(100, int((affected_count / total_assets * 50) + (successful_count / hits_count * 50)))
+
+# Estadísticas de un ataque individual, compartidas por el dashboard, el historial y la salida JSON
+def attack_statistics(affected_assets, affecting_techniques_ids, total_assets):
+    asset_counter = Counter(affected_assets)
+    technique_counter = Counter(affecting_techniques_ids)
+    max_asset_freq = max(asset_counter.values())
+    max_tech_freq = max(technique_counter.values())
+    return {
+        "affected": len(asset_counter),
+        "successful": len(technique_counter),
+        "severity": attack_severity(len(asset_counter), total_assets, len(technique_counter), len(affecting_techniques_ids)),
+        "most_affected_assets": [asset for asset, freq in asset_counter.items() if freq == max_asset_freq],
+        "max_asset_freq": max_asset_freq,
+        "most_affecting_techniques": [tech for tech, freq in technique_counter.items() if freq == max_tech_freq],
+        "max_tech_freq": max_tech_freq,
+    }
+
+# Activos comprometidos y gravedad de cada cadena de una campaña, combinando las filas de la matriz de exposición.
+# Devuelve, igual que attack_statistics para un único ataque pero agregado sobre todas las cadenas: en cuántas
+# cadenas resulta comprometido cada activo, cuántas explotaciones recibe, en cuántas cadenas tiene éxito cada
+# técnica (compromete algún activo) y la gravedad de cada cadena. Con keep_bitsets devuelve también los activos
+# comprometidos por cada cadena como bitset (una fila de palabras de 64 bits), y con 'compromised' reutiliza
+# esos bitsets, guardados con la campaña, en lugar de recalcularlos.
+def campaign_impact(chains, exposure, batch_size=100000, compromised=None, keep_bitsets=False):
+    import numpy as np
+    asset_names = exposure["names"]
+    masks, match_counts = exposure["masks"], exposure["match_counts"]
+    words = masks.shape[1]
+
+    counts = np.zeros(words * 64, dtype=np.int64)
+    technique_chains = np.zeros(len(match_counts), dtype=np.int64)
+    severities = np.zeros(len(chains), dtype=np.int64)
+    bitsets = np.zeros((len(chains), words), dtype=np.uint64) if keep_bitsets else None
+    # Lotes acotados en memoria para escenarios grandes: los bits desempaquetados ocupan lote × activos bytes
+    batch_size = max(1, min(batch_size, (1 << 26) // (words * 64)))
+    for start in range(0, len(chains), batch_size):
+        batch = chains[start:start + batch_size]
+        if compromised is not None:
+            batch_bitsets = np.asarray(compromised[start:start + batch_size], dtype=np.uint64)
+        else:
+            batch_bitsets = np.zeros((len(batch), words), dtype=np.uint64)
+            for column in batch.T:
+                batch_bitsets |= masks[column]
+        if keep_bitsets:
+            bitsets[start:start + len(batch)] = batch_bitsets
+        bits = np.unpackbits(batch_bitsets.view(np.uint8), axis=1, bitorder="little")
+        counts += bits.sum(axis=0, dtype=np.int64)
+
+        # Misma fórmula que attack_severity; las cadenas sin explotaciones tienen gravedad 0
+        affected = bits.sum(axis=1, dtype=np.int64)
+        hits = match_counts[batch].sum(axis=1)
+        ordered = np.sort(batch, axis=1)
+        first = np.ones(ordered.shape, dtype=bool)
+        first[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+        successful = first & (match_counts[ordered] > 0)
+        technique_chains += np.bincount(ordered[successful], minlength=len(match_counts))
+        if len(asset_names):
+            severity = affected / len(asset_names) * 50 + successful.sum(axis=1) / np.maximum(hits, 1) * 50
+            severities[start:start + len(batch)] = np.minimum(100, severity.astype(np.int64))
+
+    # Explotaciones por activo: cada aparición de una técnica en una cadena explota todos los activos de su fila
+    visits = np.bincount(chains[chains >= 0], minlength=len(match_counts) - 1)
+    asset_hits = np.zeros(len(asset_names), dtype=np.int64)
+    for row in np.flatnonzero(visits * match_counts[:-1]):
+        asset_hits[exposed_positions(exposure, row)] += visits[row]
+
+    return {
+        "asset_counts": counts[:len(asset_names)],
+        "asset_hits": asset_hits,
+        "technique_chains": technique_chains[:-1],
+        "technique_hits": visits * match_counts[:-1],
+        "severities": severities,
+        "compromised": bitsets,
+    }
+
+# Estadísticas agregadas de una campaña: se pueden sumar entre lotes, procesos y escenarios
+def summarize_campaign(chains, lengths, end_reasons, model, asset_names, impact):
+    import numpy as np
+    return {
+        "runs": len(chains),
+        "end_reasons": np.bincount(end_reasons, minlength=len(END_REASONS)),
+        "length_histogram": np.bincount(lengths, minlength=chains.shape[1] + 1),
+        "severity_histogram": np.bincount(impact["severities"], minlength=101),
+        "visits": np.bincount(chains[chains >= 0], minlength=len(model["states"])),
+        "asset_names": list(asset_names),
+        "asset_counts": impact["asset_counts"],
+        "asset_hits": impact["asset_hits"],
+        "technique_chains": impact["technique_chains"],
+        "technique_hits": impact["technique_hits"],
+    }
+
+def merge_campaign_summaries(summaries):
+    merged = dict(summaries[0])
+    for summary in summaries[1:]:
+        for key in ("runs", "end_reasons", "length_histogram", "severity_histogram", "visits", "asset_counts",
+                    "asset_hits", "technique_chains", "technique_hits"):
+            merged[key] = merged[key] + summary[key]
+    return merged
+
+# Percentil de la longitud (o de la gravedad) de las cadenas a partir de su histograma
+def histogram_percentile(histogram, q):
+    import numpy as np
+    return int(np.searchsorted(np.cumsum(histogram), q / 100 * histogram.sum()))
+
+# Distribución de la gravedad de las cadenas de una campaña: media, percentiles y máximo
+def severity_distribution(histogram):
+    import numpy as np
+    distribution = {"mean": round(float((np.arange(len(histogram)) * histogram).sum() / histogram.sum()), 4)}
+    for q in (25, 50, 75, 90, 99):
+        distribution[f"p{q}"] = histogram_percentile(histogram, q)
+    distribution["max"] = int(np.flatnonzero(histogram).max())
+    return distribution
+
+# Técnicas más efectivas de una campaña: las que comprometen algún activo en más cadenas
+def top_effective_techniques(summary, top=10):
+    import numpy as np
+    technique_chains = summary["technique_chains"]
+    return [i for i in np.argsort(technique_chains, kind="stable")[::-1][:top] if technique_chains[i] > 0]
+
+def display_campaign_report(summary, seed, elapsed, model, top=10):
+    import numpy as np
+    from rich.table import Table
+    from rich.align import Align
+    states = model["states"]
+    runs = summary["runs"]
+
+    print(f"\n[green][+][reset] Campaña completada: {runs} cadenas simuladas en {elapsed:.2f} s ({runs / max(elapsed, 1e-9):,.0f} cadenas/s, semilla {seed if seed is not None else 'aleatoria'}).\n")
+
+    # Finalización de las cadenas
+    table = Table(title="Finalización de las cadenas")
+    table.add_column("Motivo")
+    table.add_column("Cadenas", justify="right")
+    table.add_column("%", justify="right")
+    for reason, count in zip(END_REASONS, summary["end_reasons"]):
+        table.add_row(reason, str(count), f"{100 * count / runs:.1f}", style='cyan')
+    print(Align.center(table))
+
+    # Distribución de la longitud de las cadenas
+    histogram = summary["length_histogram"]
+    max_length = len(histogram) - 1
+    table = Table(title="Longitud de las cadenas")
+    table.add_column("Longitud")
+    table.add_column("Cadenas", justify="right")
+    table.add_column("%", justify="right")
+    for low in range(1, max_length + 1, 5):
+        high = min(low + 4, max_length)
+        count = int(histogram[low:high + 1].sum())
+        table.add_row(f"{low}-{high}" if high > low else str(low), str(count), f"{100 * count / runs:.1f}", style='cyan')
+    mean = (np.arange(len(histogram)) * histogram).sum() / runs
+    table.caption = (f"Media {mean:.2f} · P50 {histogram_percentile(histogram, 50)} · P90 {histogram_percentile(histogram, 90)}"
+                     f" · P99 {histogram_percentile(histogram, 99)} · Máx {np.flatnonzero(histogram).max()}")
+    print(Align.center(table))
+
+    # Distribución de la gravedad de las cadenas
+    bins = severity_bins(summary["severity_histogram"])
+    severity = severity_distribution(summary["severity_histogram"])
+    table = Table(title="Gravedad de las cadenas")
+    table.add_column("Gravedad")
+    table.add_column("Cadenas", justify="right")
+    table.add_column("%", justify="right")
+    for i, count in enumerate(bins):
+        table.add_row(f"{10 * i}-{10 * i + 9 if i < 9 else 100}", str(count), f"{100 * count / runs:.1f}", style='cyan')
+    table.caption = (f"Media {severity['mean']:.2f} · P50 {severity['p50']} · P90 {severity['p90']}"
+                     f" · P99 {severity['p99']} · Máx {severity['max']}")
+    print(Align.center(table))
+
+    # Frecuencia de visita de cada técnica
+    visits = summary["visits"]
+    table = Table(title="Técnicas más visitadas")
+    table.add_column("Técnica")
+    table.add_column("Visitas", justify="right")
+    table.add_column("% de visitas", justify="right")
+    for i in np.argsort(visits)[::-1][:top]:
+        table.add_row(states[i], str(visits[i]), f"{100 * visits[i] / visits.sum():.2f}", style='cyan')
+    print(Align.center(table))
+
+    # Técnicas que comprometen algún activo en más cadenas
+    technique_chains, technique_hits = summary["technique_chains"], summary["technique_hits"]
+    table = Table(title="Técnicas más efectivas")
+    table.add_column("Técnica")
+    table.add_column("Cadenas con éxito", justify="right")
+    table.add_column("% de cadenas", justify="right")
+    table.add_column("Explotaciones", justify="right")
+    for i in top_effective_techniques(summary, top):
+        table.add_row(states[i], str(technique_chains[i]), f"{100 * technique_chains[i] / runs:.1f}", str(technique_hits[i]), style='cyan')
+    print(Align.center(table))
+
+    # Activos comprometidos en más cadenas: probabilidad de compromiso por cadena y explotaciones recibidas
+    asset_names, asset_counts, asset_hits = summary["asset_names"], summary["asset_counts"], summary["asset_hits"]
+    table = Table(title="Activos más comprometidos")
+    table.add_column("Activo")
+    table.add_column("Cadenas", justify="right")
+    table.add_column("% de cadenas", justify="right")
+    table.add_column("Explotaciones", justify="right")
+    for i in np.argsort(asset_counts)[::-1][:top]:
+        table.add_row(str(asset_names[i]), str(asset_counts[i]), f"{100 * asset_counts[i] / runs:.1f}", str(asset_hits[i]), style='cyan')
+    print(Align.center(table))
+
+# Transiciones distintas recorridas por las cadenas de una campaña
+def campaign_edges(chains, model):
+    import numpy as np
+    origins, destinations = chains[:, :-1].ravel(), chains[:, 1:].ravel()
+    valid = destinations >= 0
+    pairs = np.unique(origins[valid].astype(np.int64) * len(model["states"]) + destinations[valid])
+    states = model["states"]
+    return [(states[pair // len(states)], states[pair % len(states)]) for pair in pairs]
+
+# Histograma de gravedad agrupado en tramos de 'width' puntos (la gravedad 100 cuenta en el último tramo)
+def severity_bins(histogram, width=10):
+    bins = histogram[:100].reshape(-1, width).sum(axis=1)
+    bins[-1] += histogram[100]
+    return bins
+
+# Estado de una campaña en un formato serializable (salida --json y --ndjson)
+def campaign_snapshot(summary, seed, elapsed, model, top=10, total_runs=None):
+    import numpy as np
+    runs = summary["runs"]
+    lengths = summary["length_histogram"]
+    severity = summary["severity_histogram"]
+    visits = summary["visits"]
+    asset_names, asset_counts, asset_hits = summary["asset_names"], summary["asset_counts"], summary["asset_hits"]
+    technique_chains, technique_hits = summary["technique_chains"], summary["technique_hits"]
+    return {
+        "final": total_runs is None or runs >= total_runs,
+        "runs": int(runs),
+        "total_runs": int(total_runs or runs),
+        "seed": seed,
+        "elapsed": round(elapsed, 4),
+        "chains_per_second": round(runs / max(elapsed, 1e-9), 1),
+        "end_reasons": {key: int(count) for key, count in zip(END_REASON_KEYS, summary["end_reasons"])},
+        "length": {
+            "mean": round(float((np.arange(len(lengths)) * lengths).sum() / runs), 4),
+            "p50": histogram_percentile(lengths, 50),
+            "p90": histogram_percentile(lengths, 90),
+            "p99": histogram_percentile(lengths, 99),
+            "max": int(np.flatnonzero(lengths).max()),
+        },
+        "severity": {
+            **severity_distribution(severity),
+            "histogram": [int(count) for count in severity_bins(severity)],
+        },
+        "top_techniques": [{"technique": model["states"][i], "visits": int(visits[i])}
+                           for i in np.argsort(visits)[::-1][:top]],
+        "top_effective_techniques": [{"technique": model["states"][i], "chains": int(technique_chains[i]),
+                                      "probability": round(float(technique_chains[i] / runs), 6), "exploitations": int(technique_hits[i])}
+                                     for i in top_effective_techniques(summary, top)],
+        "top_assets": [{"asset": asset_names[i], "chains": int(asset_counts[i]), "probability": round(float(asset_counts[i] / runs), 6),
+                        "exploitations": int(asset_hits[i])}
+                       for i in np.argsort(asset_counts)[::-1][:top]],
+    }
+
+# Escribir una línea JSON en la salida estándar sin pasar por rich (que interpretaría los corchetes como estilos)
+def emit_json(data):
+    sys.stdout.write(json.dumps(data, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+# Paneles del dashboard en directo de una campaña
+def campaign_live_view(summary, total_runs, elapsed, model, top=10):
+    import numpy as np
+    from rich.table import Table
+    from rich.panel import Panel
+    from rich.columns import Columns
+    from rich.console import Group
+    runs = summary["runs"]
+
+    header = Panel(
+        f"[b]Cadenas:[reset] {runs:,}/{total_runs:,} ({100 * runs / total_runs:.0f}%)   "
+        f"[b]Velocidad:[reset] {runs / max(elapsed, 1e-9):,.0f} cadenas/s   "
+        f"[b]Tiempo:[reset] {elapsed:.1f} s   "
+        f"[b]Absorción:[reset] {100 * summary['end_reasons'][END_ABSORBENT] / runs:.1f}%",
+        title="[b magenta]:link: CAMPAÑA", border_style="magenta")
+
+    bins = severity_bins(summary["severity_histogram"])
+    severity = Table(title="Gravedad", box=None)
+    severity.add_column("Tramo")
+    severity.add_column("", min_width=20)
+    severity.add_column("%", justify="right")
+    for i, count in enumerate(bins):
+        color = "green" if i < 3 else "yellow" if i < 7 else "red"
+        severity.add_row(f"{10 * i}-{10 * i + 9 if i < 9 else 100}", f"[{color}]" + "█" * int(20 * count / max(bins.max(), 1)),
+                         f"{100 * count / runs:.1f}")
+    distribution = severity_distribution(summary["severity_histogram"])
+    severity.caption = f"Media {distribution['mean']:.1f} · P50 {distribution['p50']} · P90 {distribution['p90']}"
+
+    asset_names, asset_counts = summary["asset_names"], summary["asset_counts"]
+    assets = Table(title="Activos más comprometidos", box=None)
+    assets.add_column("Activo")
+    assets.add_column("% de cadenas", justify="right")
+    for i in np.argsort(asset_counts)[::-1][:top]:
+        assets.add_row(str(asset_names[i]), f"{100 * asset_counts[i] / runs:.1f}", style='cyan')
+
+    visits = summary["visits"]
+    techniques = Table(title="Técnicas más visitadas", box=None)
+    techniques.add_column("Técnica")
+    techniques.add_column("% de visitas", justify="right")
+    for i in np.argsort(visits)[::-1][:top]:
+        techniques.add_row(model["states"][i], f"{100 * visits[i] / visits.sum():.2f}", style='cyan')
+
+    return Group(header, Columns([Panel(severity, border_style="yellow"), Panel(assets, border_style="green"),
+                                  Panel(techniques, border_style="red")]))
+
+# Almacenamiento compacto de campañas (campaign --out/--load): cadenas como arrays irregulares, activos
+# comprometidos como bitsets y ficheros reabiertos con np.memmap
+
+# Cadenas de una campaña como array irregular: índices de técnica consecutivos (uint16) y el desplazamiento de
+# inicio de cada cadena, sin el relleno -1 de la matriz que devuelve simulate_campaign
+def pack_chains(chains, lengths):
+    import numpy as np
+    offsets = np.zeros(len(chains) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return chains[chains >= 0].astype(np.uint16), offsets
+
+# Inversa de pack_chains: matriz de cadenas rellenada con -1 hasta 'width' posiciones
+def unpack_chains(flat, offsets, width):
+    import numpy as np
+    lengths = np.diff(offsets)
+    chains = np.full((len(lengths), width), -1, dtype=np.int16)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    columns = np.arange(len(rows)) - np.repeat(offsets[:-1] - offsets[0], lengths)
+    chains[rows, columns] = flat
+    return chains
+
+# Ficheros binarios de una campaña guardada y su tipo de dato; meta.json describe la campaña y se escribe al
+# final, de modo que un directorio sin él corresponde a una campaña incompleta
+CAMPAIGN_STORE_VERSION = 1
+CAMPAIGN_STORE_FILES = {"chains": "uint16", "offsets": "int64", "end_reasons": "int8", "assets": "uint64",
+                        "masks": "uint64", "match_counts": "int64"}
+
+# Volcado incremental de una campaña a disco: cada lote se añade a los ficheros y se libera, así que la memoria
+# de la campaña no crece con el número de cadenas. Se guarda también la matriz de exposición usada, para poder
+# recalcular las estadísticas al reabrirla sin volver a simular ni consultar el escenario.
+class CampaignStore:
+    def __init__(self, path, exposure):
+        import numpy as np
+        os.makedirs(path, exist_ok=True)
+        # Invalidar una campaña anterior en el mismo directorio: si esta se interrumpe, --load no debe leer los
+        # ficheros nuevos, incompletos, con los metadatos antiguos
+        try:
+            os.remove(os.path.join(path, "meta.json"))
+        except FileNotFoundError:
+            pass
+        self.path = path
+        self.exposure = exposure
+        self.runs = 0
+        self.steps = 0
+        self.width = 0
+        self.files = {name: open(os.path.join(path, f"{name}.bin"), "wb")
+                      for name in ("chains", "offsets", "end_reasons", "assets")}
+        self.files["offsets"].write(np.zeros(1, dtype=np.int64).tobytes())
+
+    def append(self, chains, lengths, end_reasons, compromised):
+        import numpy as np
+        flat, offsets = pack_chains(chains, lengths)
+        self.files["chains"].write(flat.tobytes())
+        self.files["offsets"].write((offsets[1:] + self.steps).tobytes())
+        self.files["end_reasons"].write(end_reasons.astype(np.int8).tobytes())
+        self.files["assets"].write(np.ascontiguousarray(compromised).tobytes())
+        self.runs += len(chains)
+        self.steps += int(offsets[-1])
+        self.width = chains.shape[1]
+
+    def close(self, meta):
+        for file in self.files.values():
+            file.close()
+        for name in ("masks", "match_counts"):
+            with open(os.path.join(self.path, f"{name}.bin"), "wb") as file:
+                file.write(self.exposure[name].tobytes())
+        meta = dict(meta, version=CAMPAIGN_STORE_VERSION, runs=self.runs, steps=self.steps, width=self.width,
+                    words=int(self.exposure["masks"].shape[1]), asset_names=list(self.exposure["names"]))
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as file:
+            json.dump(meta, file, ensure_ascii=False)
+
+    # Tamaño en disco de la campaña guardada (bytes)
+    def size(self):
+        return sum(os.path.getsize(os.path.join(self.path, name)) for name in os.listdir(self.path))
+
+# Reabrir una campaña guardada: los ficheros se proyectan en memoria (np.memmap) y solo se leen los lotes que
+# se recorren
+def load_campaign_store(path):
+    import numpy as np
     try:
-        with driver.session() as session:
-            for state in chain:
-                # Obtener la información de la técnica actual
-                technique_info = techniques.get(state, {})
-                
-                platforms = technique_info.get("platforms", [])
-                if isinstance(platforms, str):
-                    platforms = [platforms]
-                platforms = [platform.strip() for p in platforms for platform in p.split(",")]
-
-                permissions = technique_info.get("permissions_required", [])
-                if permissions is None:
-                    permissions = []
-                elif isinstance(permissions, str):
-                    permissions = [permissions]
-                permissions = [permission.strip() for p in permissions for permission in p.split(",")]
-                
-                requirements = technique_info.get("system_requirements", [])
-                if requirements is None:
-                    requirements = []
-                elif isinstance(requirements, str):
-                    requirements = [requirements]
-                requirements = [req.strip() for r in requirements for req in r.split(",")]
-
-                state_cwes = cwes.get(state, [])
-                state_cves = cves.get(state, [])
-                
-                # Realizar el MATCH en Neo4j con los filtros de plataforma, permisos y defensas
-                result = session.run("""
-                MATCH (a:Activo)
-                WHERE (a.platform IN $platforms AND 
-                    (ANY(permiso IN a.permissions WHERE permiso IN $permissions)
-                    OR ($requirements IS NULL OR ANY(capacidad IN a.capabilities WHERE capacidad IN $requirements))))
-                    OR a.cve IN $CVEs
-                MATCH (t:Técnica {id: $estado})
-                MATCH (n:Activo) 
-                MERGE (t)-[:EXPLOTACIÓN]->(a)
-                RETURN a.name, t.id, t.name, count(n) AS total_activos
-                """, platforms=platforms, requirements=requirements, permissions=permissions, CVEs=state_cves, estado=state)
-                
-                # Iterar sobre los registros en el resultado
-                for record in result:
-                    asset = record["a.name"]
-                    technique_id = record["t.id"]
-                    technique_name = record["t.name"]
-                    total_assets = record["total_activos"]
-                    affected_assets.append(asset)
-                    affecting_techniques_ids.append(technique_id)
-                    affecting_techniques_names.append(technique_name)
-    
-        #Crear dashboard del ataque
-        create_dashboard(affected_assets, affecting_techniques_ids, affecting_techniques_names, total_assets, chain)
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as file:
+            meta = json.load(file)
+    except FileNotFoundError:
+        return None, None
+    if meta.get("version") != CAMPAIGN_STORE_VERSION:
+        return meta, None
+
+    shapes = {"chains": (meta["steps"],), "offsets": (meta["runs"] + 1,), "end_reasons": (meta["runs"],),
+              "assets": (meta["runs"], meta["words"]), "masks": (len(meta["states"]) + 1, meta["words"]),
+              "match_counts": (len(meta["states"]) + 1,)}
+    arrays = {}
+    for name, dtype in CAMPAIGN_STORE_FILES.items():
+        # np.memmap no admite ficheros vacíos (campaña sin pasos o escenario sin activos)
+        if 0 in shapes[name]:
+            arrays[name] = np.zeros(shapes[name], dtype=dtype)
+        else:
+            arrays[name] = np.memmap(os.path.join(path, f"{name}.bin"), dtype=dtype, mode="r", shape=shapes[name])
+    return meta, arrays
+
+# Estadísticas agregadas de una campaña guardada, por lotes y con los bitsets de activos ya calculados
+def summarize_campaign_store(meta, arrays, model, batch_size=50000):
+    import numpy as np
+    exposure = {"names": meta["asset_names"], "masks": np.asarray(arrays["masks"]), "match_counts": np.asarray(arrays["match_counts"])}
+    offsets = arrays["offsets"]
+    summary = None
+    for start in range(0, meta["runs"], batch_size):
+        end = min(start + batch_size, meta["runs"])
+        batch_offsets = np.asarray(offsets[start:end + 1])
+        chains = unpack_chains(arrays["chains"][batch_offsets[0]:batch_offsets[-1]], batch_offsets, meta["width"])
+        impact = campaign_impact(chains, exposure, compromised=arrays["assets"][start:end])
+        batch = summarize_campaign(chains, np.diff(batch_offsets), np.asarray(arrays["end_reasons"][start:end]),
+                                   model, exposure["names"], impact)
+        summary = batch if summary is None else merge_campaign_summaries([summary, batch])
+    return summary
+
+# Simular la campaña por lotes de tamaño fijo (el resultado para una semilla no depende del modo de salida).
+# output: "report" (tablas al terminar), "live" (dashboard en directo), "json" (resumen final) o "ndjson"
+# (una línea por actualización). El dashboard y las líneas NDJSON se emiten como máximo 'refresh' veces
+# por segundo, de modo que la presentación no frena la simulación.
+def run_campaign(runs, seed, top=10, graph=False, timing=False, batch_size=50000, output="report", refresh=4, out=None):
+    import numpy as np
+    knowledge_base = load_knowledge_base()
+    techniques = knowledge_base["techniques"]
+    cves = knowledge_base["cves"]
+    cwes = knowledge_base["cwes"]
+    model = knowledge_base["model"]
+
+    backend = start_backend()
+    exposure = load_exposure_matrix(backend, knowledge_base)
+    asset_names = exposure["names"]
+
+    rng = np.random.default_rng(seed)
+    summary = None
+    edges = set()
+    live = None
+    store = CampaignStore(out, exposure) if out else None
+    if output == "live":
+        from rich.live import Live
+        live = Live(auto_refresh=False)
+        live.start()
+
+    start = last_update = time.perf_counter()
+    for done in range(0, runs, batch_size):
+        chains, lengths, end_reasons = simulate_campaign(min(batch_size, runs - done), model, rng)
+        impact = campaign_impact(chains, exposure, keep_bitsets=store is not None)
+        if store is not None:
+            store.append(chains, lengths, end_reasons, impact["compromised"])
+        batch = summarize_campaign(chains, lengths, end_reasons, model, asset_names, impact)
+        summary = batch if summary is None else merge_campaign_summaries([summary, batch])
+        if graph:
+            edges.update(campaign_edges(chains, model))
+
+        now = time.perf_counter()
+        if now - last_update >= 1 / refresh or summary["runs"] == runs:
+            last_update = now
+            if live is not None:
+                live.update(campaign_live_view(summary, runs, now - start, model, top), refresh=True)
+            elif output == "ndjson":
+                emit_json(campaign_snapshot(summary, seed, now - start, model, top, runs))
+    elapsed = time.perf_counter() - start
+
+    if live is not None:
+        live.stop()
+
+    if store is not None:
+        store.close({"seed": seed, "elapsed": elapsed, "batch_size": batch_size, "states": list(model["states"]),
+                     "scenario": current_scenario or cargar_escenario()})
+        if output in ("report", "live"):
+            print(f"[green][+][reset] Campaña guardada en {out} ({store.size() / 2**20:.1f} MB, {store.steps} pasos).\n")
+
+    if graph:
+        campaign_id = new_attack_id("Campaña")
+        backend.write_attack_edges(sorted(edges), techniques, cves, cwes, campaign_id, current_scenario or cargar_escenario(), timing)
+        if backend.name == "neo4j" and output in ("report", "live"):
+            print(f"[green][+][reset] Transiciones de la campaña insertadas en Neo4j ({campaign_id}).\n")
+    backend.close()
+
+    if output == "json":
+        emit_json(campaign_snapshot(summary, seed, elapsed, model, top))
+    elif output == "live":
+        print(f"\n[green][+][reset] Campaña completada: {runs} cadenas simuladas en {elapsed:.2f} s ({runs / max(elapsed, 1e-9):,.0f} cadenas/s, semilla {seed if seed is not None else 'aleatoria'}).\n")
+    elif output == "report":
+        display_campaign_report(summary, seed, elapsed, model, top)
+
+# Mostrar de nuevo una campaña guardada con --out a partir de sus ficheros, sin volver a simularla
+def run_saved_campaign(path, top=10, output="report"):
+    knowledge_base = load_knowledge_base()
+    model = knowledge_base["model"]
+
+    start = time.perf_counter()
+    meta, arrays = load_campaign_store(path)
+    if meta is None:
+        print(f"\n[red][+][reset] No hay ninguna campaña guardada en '{path}'.\n")
+        exit(1)
+    if arrays is None:
+        print(f"\n[red][+][reset] La campaña de '{path}' se guardó con otro formato. Vuelva a simularla con --out.\n")
+        exit(1)
+    if meta["states"] != list(model["states"]):
+        print(f"\n[red][+][reset] La campaña de '{path}' se simuló con otra base de conocimiento. Vuelva a simularla con --out.\n")
+        exit(1)
+    with profiler.phase("carga de la campaña"):
+        summary = summarize_campaign_store(meta, arrays, model)
+    elapsed = time.perf_counter() - start
 
-    except Neo4jError as e:
-        print("\n[red][+][reset] Error connecting to Neo4j: " + f"{e}")
+    if output == "json":
+        emit_json(campaign_snapshot(summary, meta["seed"], meta["elapsed"], model, top))
+    else:
+        print(f"\n[green][+][reset] Campaña del escenario '{meta['scenario']}' cargada desde {path}: {meta['runs']} cadenas en {1000 * elapsed:.0f} ms.")
+        display_campaign_report(summary, meta["seed"], meta["elapsed"], model, top)
+
+# Matrices de exposición de los escenarios en cada proceso trabajador, recibidas una sola vez al iniciarlo
+_worker_exposures = {}
+
+def init_parallel_worker(exposures):
+    _worker_exposures.update(exposures)
+
+# Tarea de un proceso trabajador: simular un lote de cadenas y cruzarlas con los activos de un escenario
+def parallel_campaign_task(task):
+    import numpy as np
+    scenario_file, runs, seed_sequence = task
+    model = load_knowledge_base()["model"]
+    exposure = _worker_exposures[scenario_file]
+
+    chains, lengths, end_reasons = simulate_campaign(runs, model, np.random.default_rng(seed_sequence))
+    return scenario_file, summarize_campaign(chains, lengths, end_reasons, model, exposure["names"], campaign_impact(chains, exposure))
+
+# Repartir la campaña de cada escenario en lotes de tamaño fijo entre un pool de procesos. Las semillas
+# de cada lote derivan de la semilla maestra por escenario y por lote, de modo que el resultado no
+# depende del número de procesos.
+def run_parallel_campaign(scenario_files, runs, seed, workers=None, chunk_size=50000, top=3):
+    import numpy as np
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Compilar la base de conocimiento y obtener las matrices de exposición antes de lanzar los procesos: cada
+    # trabajador las recibe una vez al iniciarse y por cada lote solo viajan su tamaño y su semilla
+    knowledge_base = load_knowledge_base()
+    model = knowledge_base["model"]
+    exposures = {scenario_file: load_exposure_matrix(OfflineBackend(scenario_file), knowledge_base, scenario_file)
+                 for scenario_file in scenario_files}
+    master = np.random.SeedSequence(seed)
+    tasks = []
+    for scenario_file, scenario_seed in zip(scenario_files, master.spawn(len(scenario_files))):
+        chunks = [min(chunk_size, runs - start) for start in range(0, runs, chunk_size)]
+        tasks.extend((scenario_file, chunk, chunk_seed) for chunk, chunk_seed in zip(chunks, scenario_seed.spawn(len(chunks))))
+
+    start = time.perf_counter()
+    summaries = defaultdict(list)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_parallel_worker, initargs=(exposures,)) as executor:
+        for scenario_file, summary in executor.map(parallel_campaign_task, tasks):
+            summaries[scenario_file].append(summary)
+    elapsed = time.perf_counter() - start
+
+    results = {scenario_file: merge_campaign_summaries(summaries[scenario_file]) for scenario_file in scenario_files}
+    display_parallel_report(results, seed, elapsed, workers or os.cpu_count(), model, top)
+
+def display_parallel_report(results, seed, elapsed, workers, model, top=3):
+    import numpy as np
+    from rich.table import Table
+    from rich.align import Align
+
+    total_runs = sum(summary["runs"] for summary in results.values())
+    print(f"\n[green][+][reset] Campaña paralela completada: {total_runs} cadenas en {len(results)} escenarios con {workers} procesos en {elapsed:.2f} s ({total_runs / max(elapsed, 1e-9):,.0f} cadenas/s, semilla {seed if seed is not None else 'aleatoria'}).\n")
+
+    table = Table(title="Resultados por escenario")
+    table.add_column("Escenario")
+    table.add_column("Cadenas", justify="right")
+    table.add_column("Absorción %", justify="right")
+    table.add_column("Longitud media", justify="right")
+    table.add_column("Activos", justify="right")
+    table.add_column("Activos más comprometidos (% de cadenas)")
+    for scenario_file, summary in results.items():
+        runs = summary["runs"]
+        histogram = summary["length_histogram"]
+        counts = summary["asset_counts"]
+        most = ", ".join(f"{summary['asset_names'][i]} ({100 * counts[i] / runs:.1f})" for i in np.argsort(counts)[::-1][:top] if counts[i] > 0)
+        table.add_row(os.path.splitext(os.path.basename(scenario_file))[0], str(runs),
+                      f"{100 * summary['end_reasons'][END_ABSORBENT] / runs:.1f}",
+                      f"{(np.arange(len(histogram)) * histogram).sum() / runs:.2f}",
+                      str(len(summary["asset_names"])), most or "-", style='cyan')
+    print(Align.center(table))
+
+    # Técnicas más visitadas en el conjunto de escenarios
+    visits = sum(summary["visits"] for summary in results.values())
+    table = Table(title="Técnicas más visitadas (todos los escenarios)")
+    table.add_column("Técnica")
+    table.add_column("Visitas", justify="right")
+    table.add_column("% de visitas", justify="right")
+    for i in np.argsort(visits)[::-1][:top]:
+        table.add_row(model["states"][i], str(visits[i]), f"{100 * visits[i] / visits.sum():.2f}", style='cyan')
+    print(Align.center(table))
+
+# Objetivos del optimizador de mitigaciones: los dos primeros se estiman sobre una muestra fija de cadenas
+# simuladas y el último se calcula de forma exacta con la cadena absorbente
+MITIGATION_OBJECTIVES = {
+    "assets": "Activos comprometidos por cadena",
+    "severity": "Gravedad media de las cadenas",
+    "exploitations": "Explotaciones esperadas por ataque",
+}
+
+# Mitigaciones candidatas: índices de las técnicas del modelo que bloquea cada una (se descartan las que no
+# cubren ninguna técnica con transiciones)
+def mitigation_candidates(mitigation_targets, model):
+    import numpy as np
+    index = model["index"]
+    candidates = {}
+    for mitigation_id, (name, targets) in sorted(mitigation_targets.items()):
+        blocked = sorted({index[target] for target in targets if target in index})
+        if blocked:
+            candidates[mitigation_id] = (name, np.array(blocked, dtype=np.int64))
+    return candidates
+
+# Impacto acumulado de cada prefijo de las cadenas de una campaña: columna c = tras ejecutar sus c primeras
+# técnicas. Una técnica mitigada no llega a ejecutarse y la cadena se detiene al intentarla, así que el
+# resultado de la cadena con mitigaciones es exactamente el de su prefijo hasta la primera técnica bloqueada.
+def campaign_prefix_impact(chains, exposure, batch_size=100000):
+    import numpy as np
+    masks, match_counts = exposure["masks"], exposure["match_counts"]
+    words = masks.shape[1]
+    runs, width = chains.shape
+
+    # Explotaciones acumuladas y técnicas distintas con éxito (primera aparición de cada técnica en la cadena)
+    hits = np.zeros((runs, width + 1), dtype=np.int32)
+    np.cumsum(match_counts[chains], axis=1, out=hits[:, 1:])
+    order = np.argsort(chains, axis=1, kind="stable")
+    ordered = np.take_along_axis(chains, order, axis=1)
+    first_sorted = np.ones(ordered.shape, dtype=bool)
+    first_sorted[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    first = np.zeros(chains.shape, dtype=bool)
+    np.put_along_axis(first, order, first_sorted, axis=1)
+    successful = np.zeros((runs, width + 1), dtype=np.int32)
+    np.cumsum(first & (match_counts[chains] > 0), axis=1, out=successful[:, 1:])
+
+    # Activos comprometidos acumulados, en lotes acotados en memoria como en campaign_impact
+    affected = np.zeros((runs, width + 1), dtype=np.int32)
+    batch_size = max(1, min(batch_size, (1 << 26) // (words * 64)))
+    for start in range(0, runs, batch_size):
+        batch = chains[start:start + batch_size]
+        compromised = np.zeros((len(batch), words), dtype=np.uint64)
+        for position, column in enumerate(batch.T, 1):
+            compromised |= masks[column]
+            affected[start:start + len(batch), position] = np.unpackbits(compromised.view(np.uint8), axis=1).sum(axis=1)
+
+    return {"affected": affected, "hits": hits, "successful": successful}
+
+# Función objetivo para un conjunto de técnicas bloqueadas (vector booleano por técnica del modelo). Los
+# objetivos muestreados reutilizan siempre las mismas cadenas (números aleatorios comunes), de modo que la
+# diferencia entre dos conjuntos de mitigaciones no depende del ruido de la simulación; cada evaluación solo
+# busca el primer bloqueo de cada cadena y lee su prefijo. El objetivo analítico resuelve la cadena
+# absorbente sin las transiciones hacia las técnicas bloqueadas: start'·N'·h, con h las explotaciones de
+# cada técnica sobre el escenario.
+def mitigation_evaluator(objective, model, exposure, runs=5000, seed=None):
+    import numpy as np
+    if objective == "exploitations":
+        from scipy import sparse
+        from scipy.sparse import linalg as splinalg
+        size = len(model["states"])
+        q = sparse.diags(1.0 - model["absorbent"]) @ transition_matrix(model)
+        identity = sparse.identity(size, format="csc")
+        exploitations = exposure["match_counts"][:-1].astype(np.float64)
+        start = np.zeros(size, dtype=np.float64)
+        start[model["sources"]] = 1.0 / len(model["sources"])
+
+        def evaluate(blocked):
+            keep = (~blocked).astype(np.float64)
+            lu = splinalg.splu(sparse.csc_matrix(identity - q @ sparse.diags(keep)))
+            return float((start * keep) @ lu.solve(exploitations))
+        return evaluate
+
+    chains, _, _ = simulate_campaign(runs, model, np.random.default_rng(seed))
+    prefix = campaign_prefix_impact(chains, exposure)
+    rows = np.arange(runs)
+    width = chains.shape[1]
+    total_assets = len(exposure["names"])
+
+    def evaluate(blocked):
+        # El relleno (-1) de las cadenas indexa el último elemento, que nunca está bloqueado
+        stopped = np.append(blocked, False)[chains]
+        cuts = np.where(stopped.any(axis=1), stopped.argmax(axis=1), width)
+        affected = prefix["affected"][rows, cuts]
+        if objective == "assets":
+            return float(affected.mean())
+        hits = prefix["hits"][rows, cuts]
+        # Misma fórmula que attack_severity; las cadenas sin explotaciones tienen gravedad 0
+        severity = affected / total_assets * 50 + prefix["successful"][rows, cuts] / np.maximum(hits, 1) * 50
+        return float(np.minimum(100, severity.astype(np.int64)).mean())
+    return evaluate
+
+# Selección voraz de hasta 'budget' mitigaciones con evaluación perezosa (CELF): la mejora marginal de una
+# mitigación solo puede disminuir al añadir otras, así que basta con reevaluar la candidata con mayor mejora
+# conocida hasta que siga en cabeza tras actualizarla. Se detiene si ninguna mitigación reduce el objetivo.
+def optimize_mitigations(candidates, evaluate, size, budget=3):
+    import heapq
+    import numpy as np
+    blocked = np.zeros(size, dtype=bool)
+    baseline = current = evaluate(blocked)
+    evaluations = 1
+
+    def gain(mitigation_id):
+        candidate = blocked.copy()
+        candidate[candidates[mitigation_id][1]] = True
+        return current - evaluate(candidate)
+
+    heap = []
+    for mitigation_id in candidates:
+        heap.append((-gain(mitigation_id), mitigation_id, 0))
+        evaluations += 1
+    heapq.heapify(heap)
+
+    selected = []
+    while heap and len(selected) < budget:
+        negative_gain, mitigation_id, round_ = heapq.heappop(heap)
+        if round_ < len(selected):
+            heapq.heappush(heap, (-gain(mitigation_id), mitigation_id, len(selected)))
+            evaluations += 1
+            continue
+        if -negative_gain <= 0:
+            break
+        blocked[candidates[mitigation_id][1]] = True
+        current -= -negative_gain
+        selected.append((mitigation_id, -negative_gain, current))
+
+    return {"baseline": baseline, "selected": selected, "blocked": blocked, "evaluations": evaluations}
+
+def display_mitigation_plan(result, candidates, objective, model, budget, runs, seed, prepare_time, search_time):
+    from rich.table import Table
+    from rich.align import Align
+    baseline = result["baseline"]
+    sample = "cálculo exacto" if objective == "exploitations" else f"{runs} cadenas, semilla {seed if seed is not None else 'aleatoria'}"
+    print(f"\n[green][+][reset] {len(result['selected'])} de {budget} mitigaciones seleccionadas entre {len(candidates)} candidatas"
+          f" ({sample}): {result['evaluations']} conjuntos evaluados en {1000 * search_time:.0f} ms"
+          f" ({result['evaluations'] / max(search_time, 1e-9):,.0f} evaluaciones/s, preparación {1000 * prepare_time:.0f} ms).\n")
+
+    table = Table(title=f"Mitigaciones seleccionadas: {MITIGATION_OBJECTIVES[objective].lower()}")
+    table.add_column("#", justify="right")
+    table.add_column("Mitigación")
+    table.add_column("Técnicas", justify="right")
+    table.add_column("Mejora", justify="right")
+    table.add_column("Objetivo", justify="right")
+    table.add_column("Reducción %", justify="right")
+    table.add_row("", "Sin mitigaciones", "", "", f"{baseline:.3f}", "", style='cyan')
+    for rank, (mitigation_id, gain, value) in enumerate(result["selected"], 1):
+        name, blocked = candidates[mitigation_id]
+        table.add_row(str(rank), f"{mitigation_id} {name}", str(len(blocked)), f"{gain:.3f}", f"{value:.3f}",
+                      f"{100 * (baseline - value) / baseline:.1f}" if baseline > 0 else "-", style='cyan')
+    table.caption = f"{int(result['blocked'].sum())} de {len(model['states'])} técnicas bloqueadas"
+    print(Align.center(table))
+
+def run_optimize(budget=3, objective="assets", runs=5000, seed=None, output="report"):
+    knowledge_base = load_knowledge_base()
+    model = knowledge_base["model"]
+    if objective not in MITIGATION_OBJECTIVES:
+        print(f"\n[red][+][reset] Objetivo no válido. Elija uno de: {', '.join(MITIGATION_OBJECTIVES)}.\n")
         exit(1)
 
-def create_dashboard(affected_assets, affecting_techniques_ids, affecting_techniques_names, total_assets, chain):
+    backend = start_backend()
+    exposure = load_exposure_matrix(backend, knowledge_base)
+    backend.close()
+    if not exposure["names"]:
+        print("\n[red][+][reset] El escenario no tiene activos sobre los que evaluar las mitigaciones.\n")
+        exit(1)
+    candidates = mitigation_candidates(knowledge_base["mitigation_targets"], model)
+
+    with profiler.phase("preparación"):
+        start = time.perf_counter()
+        evaluate = mitigation_evaluator(objective, model, exposure, runs, seed)
+        prepare_time = time.perf_counter() - start
+    with profiler.phase("búsqueda voraz"):
+        start = time.perf_counter()
+        result = optimize_mitigations(candidates, evaluate, len(model["states"]), budget)
+        search_time = time.perf_counter() - start
+    profiler.count("conjuntos evaluados", result["evaluations"])
+
+    if output == "json":
+        emit_json({
+            "objective": objective,
+            "budget": budget,
+            "runs": None if objective == "exploitations" else runs,
+            "seed": seed,
+            "baseline": round(result["baseline"], 6),
+            "evaluations": result["evaluations"],
+            "evaluations_per_second": round(result["evaluations"] / max(search_time, 1e-9), 1),
+            "elapsed_ms": round(1000 * (prepare_time + search_time), 3),
+            "selected": [{"id": mitigation_id, "name": candidates[mitigation_id][0],
+                          "techniques": [model["states"][i] for i in candidates[mitigation_id][1]],
+                          "gain": round(gain, 6), "value": round(value, 6)}
+                         for mitigation_id, gain, value in result["selected"]],
+        })
+    else:
+        display_mitigation_plan(result, candidates, objective, model, budget, runs, seed, prepare_time, search_time)
+
+def create_dashboard(affected_assets, affecting_techniques_ids, affecting_techniques_names, total_assets, chain, attack_id, seed=None):
+    profiler.begin("dashboard")
+    from rich.align import Align
+    from rich.panel import Panel
+    from rich.layout import Layout
+    from rich.bar import Bar
+    from rich.console import Group
+    from rich.text import Text
      
     if len(affected_assets) != len(affecting_techniques_ids):
         print("\n[red][+][reset] Error: Las listas deben tener la misma longitud.")
         return
     
     try:  
-        secure_assets = int(total_assets) - int(len(set(affected_assets)))
-        affected_assets_count = len(set(affected_assets))
-        successful_techniques_count = len(set(affecting_techniques_ids))
-        attack_severity = min(100, int((affected_assets_count / total_assets * 50) + (successful_techniques_count / len(affecting_techniques_ids) * 50)))
+        statistics = attack_statistics(affected_assets, affecting_techniques_ids, total_assets)
+        secure_assets = int(total_assets) - statistics["affected"]
+        affected_assets_count = statistics["affected"]
+        successful_techniques_count = statistics["successful"]
+        attack_severity = statistics["severity"]
 
     except:
         print("\n[red][+][reset] No se han encontrado activos. Recuerda cargar primero el escenario.\n")
@@ -415,20 +2604,15 @@ def create_dashboard(affected_assets, affecting_techniques_ids, affecting_techni
     # Crear un Panel con el contenido generado
     defense_panel = Panel(defense_content, title="[b blue]:shield: DEFENSA", padding=(0, 1), border_style="blue")
    
-    # Calcular activos más afectados   
-    counter = Counter(affected_assets)
-    max_asset_freq = max(counter.values())
-    most_affected_assets = [activo for activo, frecuencia in counter.items() if frecuencia == max_asset_freq]
-    maa_str = ", ".join(most_affected_assets)
-
-    # Calcular técnicas más exitosas   
-    counter = Counter(affecting_techniques_ids)
-    max_tech_freq = max(counter.values())
-    most_affecting_techniques = [tech for tech, frecuencia in counter.items() if frecuencia == max_tech_freq]
+    # Activos más afectados y técnicas más exitosas
+    max_asset_freq = statistics["max_asset_freq"]
+    maa_str = ", ".join(statistics["most_affected_assets"])
+    max_tech_freq = statistics["max_tech_freq"]
+    most_affecting_techniques = statistics["most_affecting_techniques"]
     mat_str = ", ".join(most_affecting_techniques)
     
     # Obtener mitigaciones asociadas a las técnicas más exitosas
-    mitigations = load_mitigations_json('ttp_mitigations.json')
+    mitigations = load_knowledge_base()["mitigations"]
     unique_mitigations = list({mitigations[tech] for tech in most_affecting_techniques if tech in mitigations})
     mit_str = ", ".join(unique_mitigations)
 
@@ -504,97 +2688,563 @@ def create_dashboard(affected_assets, affecting_techniques_ids, affecting_techni
         Layout(tecnicas_panel, ratio=1)
     )
 
-    # Generar un ID único para el ataque y almacenarlo en el histórico
-    attack_id = f"Ataque-{random.randint(1000, 9999)}"
-    scenario=cargar_escenario()
-    save_attack_stats_csv(attack_id, scenario, maa_str, mat_str)
+    profiler.end()
+
+    # Almacenar el ataque en el histórico con el mismo ID que sus relaciones en el grafo
+    scenario=current_scenario or cargar_escenario()
+    with profiler.phase("historial"):
+        save_attack_history(attack_id, scenario, chain, list(zip(affected_assets, affecting_techniques_ids)), attack_severity,
+                            total_assets, maa_str, mat_str, seed)
 
     from rich.live import Live
     # Mantener el layout visible usando Live
     with Live(layout, screen=True):
         input("Presiona Enter para salir...")
 
-def save_attack_stats_csv(attack_id, scenario, most_affected_asset, most_recurrent_asset):
-    # Verifica si el archivo ya existe para añadir encabezados solo en caso necesario
-    file_exists = os.path.isfile('attack_history.csv')
-
-    with open('attack_history.csv', mode='a', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        if not file_exists:
-            # Escribe los encabezados si el archivo se está creando
-            writer.writerow(["ID Ataque", "Escenario", "Activo Más Afectado", "Técnica más exitosa", "Fecha de ejecución"])
-
-        # Registra los datos del ataque
-        writer.writerow([attack_id, scenario, most_affected_asset, most_recurrent_asset, str(datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))])
-    
-    print(f"[green][+][reset] Estadísticas del ataque {attack_id} guardadas en attack_history.csv.\n")
-
-def display_attack_history_csv():
+HISTORY_DB = 'attack_history.db'
+LEGACY_HISTORY_CSV = 'attack_history.csv'
+
+HISTORY_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS ataques (
+        id INTEGER PRIMARY KEY,
+        ataque TEXT NOT NULL,
+        escenario TEXT,
+        semilla INTEGER,
+        gravedad INTEGER,
+        longitud INTEGER,
+        activos_afectados INTEGER,
+        activos_totales INTEGER,
+        activo_mas_afectado TEXT,
+        tecnica_mas_exitosa TEXT,
+        fecha TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS pasos (
+        ataque_id INTEGER NOT NULL REFERENCES ataques(id) ON DELETE CASCADE,
+        posicion INTEGER NOT NULL,
+        tecnica TEXT NOT NULL,
+        PRIMARY KEY (ataque_id, posicion)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS impactos (
+        ataque_id INTEGER NOT NULL REFERENCES ataques(id) ON DELETE CASCADE,
+        activo TEXT NOT NULL,
+        tecnica TEXT NOT NULL,
+        veces INTEGER NOT NULL,
+        PRIMARY KEY (ataque_id, activo, tecnica)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_ataques_escenario_fecha ON ataques(escenario, fecha);
+    CREATE INDEX IF NOT EXISTS idx_ataques_fecha ON ataques(fecha);
+    CREATE INDEX IF NOT EXISTS idx_ataques_gravedad ON ataques(gravedad);
+    CREATE INDEX IF NOT EXISTS idx_ataques_ataque ON ataques(ataque);
+    CREATE INDEX IF NOT EXISTS idx_pasos_tecnica ON pasos(tecnica);
+    CREATE INDEX IF NOT EXISTS idx_impactos_activo ON impactos(activo);
+    CREATE INDEX IF NOT EXISTS idx_impactos_tecnica ON impactos(tecnica);
+"""
+
+def new_attack_id(prefix="Ataque"):
+    return f"{prefix}-{uuid.uuid4().hex[:10]}"
+
+# Abrir el historial de ataques (SQLite), creándolo e importando el antiguo attack_history.csv si es necesario
+def open_history():
+    import sqlite3
+    exists = os.path.isfile(HISTORY_DB)
+    connection = sqlite3.connect(HISTORY_DB, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA foreign_keys=ON")
+    connection.executescript(HISTORY_SCHEMA)
+
+    if not exists and os.path.isfile(LEGACY_HISTORY_CSV):
+        with open(LEGACY_HISTORY_CSV, newline='', encoding='utf-8') as file:
+            reader = csv.reader(file)
+            next(reader, None)  # Encabezados
+            with connection:
+                connection.executemany("""
+                    INSERT INTO ataques (ataque, escenario, activo_mas_afectado, tecnica_mas_exitosa, fecha)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (row[:5] for row in reader if len(row) >= 5))
+    return connection
+
+def save_attack_history(attack_id, scenario, chain, hits, severity, total_assets, most_affected_asset, most_recurrent_technique, seed=None, verbose=True):
+    connection = open_history()
     try:
-        df = pd.read_csv('attack_history.csv', skipinitialspace = True,quotechar='"')
-
-        table = Table(title="Historial de ataques")
-        rows = df.values.tolist()
-        rows = [[str(el) for el in row] for row in rows]
-        columns = df.columns.tolist()
-
-        for column in columns:
-            table.add_column(column)
-
-        for row in rows:
-            table.add_row(*row, style='cyan')
+        with connection:
+            cursor = connection.execute("""
+                INSERT INTO ataques (ataque, escenario, semilla, gravedad, longitud, activos_afectados, activos_totales,
+                                     activo_mas_afectado, tecnica_mas_exitosa, fecha)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (attack_id, str(scenario), seed, severity, len(chain), len({asset for asset, _ in hits}), total_assets,
+                  most_affected_asset, most_recurrent_technique, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            row_id = cursor.lastrowid
+            connection.executemany("INSERT INTO pasos (ataque_id, posicion, tecnica) VALUES (?, ?, ?)",
+                                   ((row_id, position, state) for position, state in enumerate(chain)))
+            connection.executemany("INSERT INTO impactos (ataque_id, activo, tecnica, veces) VALUES (?, ?, ?, ?)",
+                                   ((row_id, asset, technique, count) for (asset, technique), count in Counter(hits).items()))
+    finally:
+        connection.close()
+
+    if verbose:
+        print(f"[green][+][reset] Estadísticas del ataque {attack_id} guardadas en {HISTORY_DB}.\n")
+
+# Construir la cláusula WHERE del historial a partir de los filtros de la línea de comandos
+def history_filters(filters):
+    conditions, parameters = [], []
+    if filters.get("scenario"):
+        conditions.append("a.escenario = ?")
+        parameters.append(filters["scenario"])
+    if filters.get("since"):
+        conditions.append("a.fecha >= ?")
+        parameters.append(filters["since"])
+    if filters.get("until"):
+        # Una fecha sin hora incluye todo ese día: las fechas se guardan como 'AAAA-MM-DD HH:MM:SS'
+        if len(filters["until"]) == 10:
+            conditions.append("a.fecha < date(?, '+1 day')")
+        else:
+            conditions.append("a.fecha <= ?")
+        parameters.append(filters["until"])
+    if filters.get("min_severity") is not None:
+        conditions.append("a.gravedad >= ?")
+        parameters.append(filters["min_severity"])
+    if filters.get("asset"):
+        conditions.append("EXISTS (SELECT 1 FROM impactos i WHERE i.ataque_id = a.id AND i.activo = ?)")
+        parameters.append(filters["asset"])
+    if filters.get("technique"):
+        conditions.append("EXISTS (SELECT 1 FROM pasos p WHERE p.ataque_id = a.id AND p.tecnica = ?)")
+        parameters.append(filters["technique"])
+    return ("WHERE " + " AND ".join(conditions)) if conditions else "", parameters
+
+def display_attack_history(filters, limit=20, page=1, stats=False):
+    from rich.table import Table
+    from rich.align import Align
+
+    connection = open_history()
+    where, parameters = history_filters(filters)
+    try:
+        total = connection.execute(f"SELECT count(*) FROM ataques a {where}", parameters).fetchone()[0]
+        if total == 0:
+            print("\n[red][+][reset] No hay ataques en el historial que cumplan los filtros. Ejecuta al menos un ataque para generar el historial.\n")
+            return
 
-        print(Align.center(table))
+        if stats:
+            display_history_stats(connection, where, parameters, total)
+            return
 
-    except FileNotFoundError:
-        print("\n[red][+][reset] No se ha encontrado el archivo attack_history.csv. Ejecuta al menos un ataque para generar el historial.\n")
+        rows = connection.execute(f"""
+            SELECT a.ataque, a.escenario, a.activo_mas_afectado, a.tecnica_mas_exitosa, a.gravedad, a.longitud, a.semilla, a.fecha
+            FROM ataques a {where}
+            ORDER BY a.fecha DESC, a.id DESC
+            LIMIT ? OFFSET ?
+        """, parameters + [limit, (page - 1) * limit]).fetchall()
+    finally:
+        connection.close()
+
+    pages = (total + limit - 1) // limit
+    table = Table(title="Historial de ataques", caption=f"Página {page} de {pages} · {total} ataques")
+    for column in ["ID Ataque", "Escenario", "Activo Más Afectado", "Técnica más exitosa", "Gravedad", "Longitud", "Semilla", "Fecha de ejecución"]:
+        table.add_column(column)
+    for row in rows:
+        table.add_row(*("-" if value is None else str(value) for value in row), style='cyan')
+    print(Align.center(table))
+
+# Agregados calculados en SQLite sobre los ataques filtrados
+def display_history_stats(connection, where, parameters, total):
+    from rich.table import Table
+    from rich.align import Align
+
+    table = Table(title=f"Resumen del historial ({total} ataques)")
+    for column in ["Escenario", "Ataques", "Gravedad media", "Gravedad máxima", "Longitud media", "Último ataque"]:
+        table.add_column(column)
+    for row in connection.execute(f"""
+        SELECT a.escenario, count(*), round(avg(a.gravedad), 1), max(a.gravedad), round(avg(a.longitud), 1), max(a.fecha)
+        FROM ataques a {where}
+        GROUP BY a.escenario ORDER BY count(*) DESC
+    """, parameters):
+        table.add_row(*("-" if value is None else str(value) for value in row), style='cyan')
+    print(Align.center(table))
+
+    table = Table(title="Activos comprometidos en más ataques")
+    table.add_column("Activo")
+    table.add_column("Ataques", justify="right")
+    table.add_column("Impactos", justify="right")
+    for row in connection.execute(f"""
+        SELECT i.activo, count(DISTINCT i.ataque_id), sum(i.veces)
+        FROM impactos i JOIN ataques a ON a.id = i.ataque_id {where}
+        GROUP BY i.activo ORDER BY 2 DESC LIMIT 10
+    """, parameters):
+        table.add_row(*(str(value) for value in row), style='cyan')
+    print(Align.center(table))
+
+    table = Table(title="Técnicas más utilizadas")
+    table.add_column("Técnica")
+    table.add_column("Ataques", justify="right")
+    table.add_column("Apariciones", justify="right")
+    for row in connection.execute(f"""
+        SELECT p.tecnica, count(DISTINCT p.ataque_id), count(*)
+        FROM pasos p JOIN ataques a ON a.id = p.ataque_id {where}
+        GROUP BY p.tecnica ORDER BY 2 DESC LIMIT 10
+    """, parameters):
+        table.add_row(*(str(value) for value in row), style='cyan')
+    print(Align.center(table))
+
+# Borrado por lotes con CALL {...} IN TRANSACTIONS: cada lote se confirma por separado, de modo que el tiempo
+# y la memoria de cada transacción no crecen con el tamaño del grafo. Con attack_id o scenario solo se borran
+# las relaciones TRANSICIÓN y EXPLOTACIÓN de ese ataque o escenario y las técnicas que quedan sin relaciones;
+# sin filtros se borra todo el grafo.
+def clean_database(driver, attack_id=None, scenario=None, batch_size=10000):
+    from neo4j.exceptions import Neo4jError
+    batch = f"IN TRANSACTIONS OF {int(batch_size)} ROWS"
+    if attack_id is None and scenario is None:
+        statements = [f"MATCH (n) CALL {{ WITH n DETACH DELETE n }} {batch}"]
+    else:
+        key, value = ("ataque", attack_id) if attack_id is not None else ("escenario", scenario)
+        statements = [f"MATCH ()-[r:{relationship} {{{key}: $value}}]->() CALL {{ WITH r DELETE r }} {batch}"
+                      for relationship in ("EXPLOTACIÓN", "TRANSICIÓN")]
+        statements.append(f"MATCH (t:Técnica) WHERE NOT (t)--() CALL {{ WITH t DELETE t }} {batch}")
 
-def clean_database(driver):
     try:
+        nodes, relationships = 0, 0
         with driver.session() as session:
-            session.run("""
-                MATCH (n)
-                DETACH DELETE n
-            """)
-            print("\n[green][+][reset] Database cleared\n")
+            for statement in statements:
+                # Las consultas IN TRANSACTIONS solo pueden ejecutarse en transacciones implícitas (session.run)
+                counters = session.run(statement, value=attack_id if attack_id is not None else scenario).consume().counters
+                nodes += counters.nodes_deleted
+                relationships += counters.relationships_deleted
+                profiler.count("consultas")
+        if attack_id is not None:
+            print(f"\n[green][+][reset] Ataque {attack_id} eliminado: {relationships} relaciones y {nodes} técnicas sin relaciones.\n")
+        elif scenario is not None:
+            print(f"\n[green][+][reset] Ataques del escenario '{scenario}' eliminados: {relationships} relaciones y {nodes} técnicas sin relaciones.\n")
+        else:
+            print(f"\n[green][+][reset] Database cleared ({nodes} nodos y {relationships} relaciones en lotes de {int(batch_size)}).\n")
 
     except Neo4jError as e:
         print("\n[red][+][reset] Error connecting to Neo4j: " + f"[reset]{e}")
         exit(1)
 
-def guardar_escenario(escenario):
+# El escenario actual se guarda como ruta absoluta de su fichero, de modo que se encuentra aunque no esté
+# en el directorio scenarios; los ficheros antiguos, que solo guardaban el nombre, se siguen admitiendo
+def guardar_escenario(scenario_file):
     with open('current_scenario.txt', "w") as file:
-        file.write(str(escenario))
+        file.write(os.path.abspath(scenario_file))
 
 def cargar_escenario():
     try:
         with open('current_scenario.txt', "r") as file:
-            return file.read()
+            return scenario_name(file.read().strip())
     except FileNotFoundError:
         return 0
 
+def cargar_fichero_escenario():
+    try:
+        with open('current_scenario.txt', "r") as file:
+            return find_scenario_file(file.read().strip())
+    except FileNotFoundError:
+        return find_scenario_file("0")
+
 # Función para conectar a la base de datos de Neo4j
-def connect_neo4j(uri, user, password):
+def connect_neo4j(uri, user, password, **pool_options):
+    from neo4j import GraphDatabase
+    from neo4j.exceptions import Neo4jError
     try:
-        driver = GraphDatabase.driver(uri, auth=(user, password))
+        driver = GraphDatabase.driver(uri, auth=(user, password), **pool_options)
         return driver
 
     except Neo4jError as e:
         print(f"\n[red][+][reset] Error connecting to Neo4j: {e}")
         exit(1)
 
-def start_neo4j():
-    # Conectar a la base de datos de Neo4j
-    uri = "bolt://localhost:7687"
-    user = "neo4j"
-    password = "argos123"
-    driver = connect_neo4j(uri, user, password)
+def start_neo4j(**pool_options):
+    # Conectar a la base de datos de Neo4j (parámetros --uri/--user/--password o variables de entorno ARGOS_NEO4J_*)
+    uri = get_option("--uri", os.environ.get("ARGOS_NEO4J_URI", "bolt://localhost:7687"))
+    user = get_option("--user", os.environ.get("ARGOS_NEO4J_USER", "neo4j"))
+    password = get_option("--password", os.environ.get("ARGOS_NEO4J_PASSWORD", "argos123"))
+    driver = connect_neo4j(uri, user, password, **pool_options)
     return driver
 
 def close_neo4j(driver):
     # Cerrar la conexión a la base de datos
     driver.close()
 
+# Backend persistente: el escenario y los ataques se almacenan en un servidor Neo4j
+class Neo4jBackend:
+    name = "neo4j"
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def load_scenario(self, scenario_file, batch_size=5000):
+        create_scenario_graph(self.driver, scenario_file, batch_size)
+
+    # Crear restricciones e índices; con check, comparar el plan de las consultas antes y después
+    def create_schema(self, check=False):
+        if check:
+            parameters = profile_parameters(self.driver)
+            before = profile_matching_queries(self.driver, parameters)
+        create_schema(self.driver)
+        if check:
+            display_profile_comparison(before, profile_matching_queries(self.driver, parameters))
+
+    def write_attack_edges(self, edges, techniques, cves, cwes, attack_id, scenario, timing=False):
+        write_attack_edges(self.driver, edges, techniques, cves, cwes, attack_id, scenario, timing)
+
+    def load_assets(self):
+        return load_scenario_assets(self.driver)
+
+    def load_links(self):
+        return load_scenario_links(self.driver)
+
+    def write_exploitation_edges(self, hits, attack_id, scenario):
+        write_exploitation_edges(self.driver, hits, attack_id, scenario)
+
+    def clean(self, attack_id=None, scenario=None, batch_size=10000):
+        clean_database(self.driver, attack_id, scenario, batch_size)
+
+    def close(self):
+        close_neo4j(self.driver)
+
+# Backend sin base de datos: el escenario se lee de su fichero .cypher y el ataque se mantiene en memoria
+class OfflineBackend:
+    name = "offline"
+
+    def __init__(self, scenario_file=None):
+        self.scenario_file = scenario_file
+        self.graph = None
+        self.techniques = {}
+        self.transitions = set()
+        self.exploits = set()
+        # serve atiende cada petición en un hilo: toda modificación del ataque en memoria se hace con el cerrojo
+        self.lock = threading.Lock()
+
+    def load_scenario(self, scenario_file, batch_size=None):
+        global current_scenario
+        self.scenario_file = scenario_file
+        self.graph = load_scenario_file(scenario_file)
+        current_scenario = scenario_name(scenario_file)
+        return self.graph
+
+    def get_graph(self):
+        if self.graph is None:
+            # Sin --scenario se usa el último escenario preparado
+            scenario_file = self.scenario_file or cargar_fichero_escenario()
+            self.load_scenario(scenario_file)
+        return self.graph
+
+    def create_schema(self, check=False):
+        pass  # Sin base de datos no hay esquema que preparar
+
+    def write_attack_edges(self, edges, techniques, cves, cwes, attack_id, scenario, timing=False):
+        start = time.perf_counter()
+        with self.lock:
+            for edge in edges:
+                for state in edge:
+                    self.techniques[state] = technique_properties(state, techniques, cves, cwes)
+                self.transitions.add((attack_id, scenario) + tuple(edge))
+        profiler.count("transiciones escritas", len(set(edges)))
+        if timing:
+            print(f"[blue][+][reset] Escritura del ataque: {len(set(edges))} transiciones en memoria ({1000 * (time.perf_counter() - start):.1f} ms).\n")
+
+    def load_assets(self):
+        assets = [node["properties"] for node in self.get_graph()["nodes"] if "Activo" in node["labels"]]
+        profiler.count("registros leídos", len(assets))
+        return assets
+
+    def load_links(self):
+        nodes = self.get_graph()["nodes"]
+        return [(nodes[link["source"]]["properties"].get("name"), nodes[link["target"]]["properties"].get("name"))
+                for link in self.get_graph()["links"]
+                if "Activo" in nodes[link["source"]]["labels"] and "Activo" in nodes[link["target"]]["labels"]]
+
+    def write_exploitation_edges(self, hits, attack_id, scenario):
+        with self.lock:
+            self.exploits.update((attack_id, scenario, technique_id, asset) for asset, technique_id in hits if technique_id in self.techniques)
+        profiler.count("explotaciones escritas", len(set(hits)))
+
+    # Descartar un ataque ya resuelto, para que un proceso de larga duración (serve) no acumule memoria
+    def discard(self, attack_id):
+        with self.lock:
+            self.transitions = {transition for transition in self.transitions if transition[0] != attack_id}
+            self.exploits = {exploit for exploit in self.exploits if exploit[0] != attack_id}
+
+    def clean(self, attack_id=None, scenario=None, batch_size=None):
+        with self.lock:
+            self.techniques.clear()
+            self.transitions.clear()
+            self.exploits.clear()
+        print("\n[green][+][reset] Modo sin base de datos: no hay datos persistentes que limpiar.\n")
+
+    def close(self):
+        pass
+
+BACKENDS = ["neo4j", "offline"]
+
+# Seleccionar el backend de la ejecución: --backend neo4j|offline (--no-db equivale a offline)
+def start_backend(**pool_options):
+    backend = get_option("--backend", "offline" if "--no-db" in sys.argv else "neo4j")
+    if backend == "neo4j":
+        return Neo4jBackend(start_neo4j(**pool_options))
+    elif backend == "offline":
+        scenario = get_option("--scenario")
+        return OfflineBackend(find_scenario_file(scenario) if scenario else None)
+    print(f"[reset]Backend no válido: {backend}. Opciones: {', '.join(BACKENDS)}.")
+    exit(1)
+
+# Ejecutar un ataque completo sin dashboard (API de biblioteca y servicio serve)
+def run_attack(backend, knowledge_base, exposure, start_state=None, seed=None, num_steps=30, lateral=False, entry=None):
+    techniques = knowledge_base["techniques"]
+    cves = knowledge_base["cves"]
+    cwes = knowledge_base["cwes"]
+    rng = random.Random(seed)
+
+    if start_state is None:
+        start_state = rng.choice(list(knowledge_base["transitions"]))
+    elif start_state not in knowledge_base["transitions"]:
+        raise ValueError(f"El estado inicial {start_state} no es válido")
+
+    if lateral and entry is not None and entry not in exposure["names"]:
+        raise ValueError(f"El activo de entrada {entry} no existe en el escenario")
+
+    with profiler.phase("simulación"):
+        chain = simulate_chain(start_state, num_steps, knowledge_base["model"], rng=rng, verbose=False)
+    attack_id = new_attack_id()
+    create_attack_graph(backend, chain, techniques, cves, cwes, attack_id)
+    with profiler.phase("correspondencia"):
+        if lateral:
+            affected_assets, affecting_techniques_ids, _ = lateral_attack_assets(exposure, chain, knowledge_base["model"], techniques, entry)
+        else:
+            affected_assets, affecting_techniques_ids, _ = exposed_attack_assets(exposure, chain, knowledge_base["model"], techniques)
+    with profiler.phase("escritura de explotaciones"):
+        backend.write_exploitation_edges(list(zip(affected_assets, affecting_techniques_ids)), attack_id, current_scenario or cargar_escenario())
+
+    result = {
+        "attack_id": attack_id,
+        "chain": chain,
+        "hits": [{"asset": asset, "technique": technique} for asset, technique in zip(affected_assets, affecting_techniques_ids)],
+        "affected_assets": sorted(set(affected_assets)),
+        "total_assets": len(exposure["names"]),
+        # Un ataque sin explotaciones tiene gravedad 0, igual que en las campañas
+        "severity": 0,
+        "most_affected_assets": [],
+        "most_affecting_techniques": [],
+    }
+    if affected_assets:
+        statistics = attack_statistics(affected_assets, affecting_techniques_ids, result["total_assets"])
+        result["severity"] = statistics["severity"]
+        result["most_affected_assets"] = statistics["most_affected_assets"]
+        result["most_affecting_techniques"] = statistics["most_affecting_techniques"]
+    return result
+
+# Ataque sin dashboard (attack/trace --json): la misma semilla produce la misma cadena que en modo interactivo,
+# el ataque se guarda en el historial y el resultado se escribe como una línea JSON
+def run_headless_attack(knowledge_base, seed, start_state=None, lateral=False, entry=None):
+    backend = start_backend()
+    with profiler.phase("carga de activos"):
+        exposure = load_exposure_matrix(backend, knowledge_base)
+    try:
+        result = run_attack(backend, knowledge_base, exposure, start_state, seed, lateral=lateral, entry=entry)
+    except ValueError as e:
+        print(f"\n[red][+][reset] {e}.\n")
+        exit(1)
+    finally:
+        backend.close()
+
+    result["seed"] = seed
+    save_attack_result(result)
+    emit_json(result)
+
+# Guardar en el historial el resultado de run_attack (attack --json y serve), con el mismo identificador. Se
+# guardan también los ataques sin explotaciones, para no sesgar las estadísticas del historial
+def save_attack_result(result):
+    with profiler.phase("historial"):
+        save_attack_history(result["attack_id"], current_scenario or cargar_escenario(), result["chain"],
+                            [(hit["asset"], hit["technique"]) for hit in result["hits"]], result["severity"],
+                            result["total_assets"], ", ".join(result["most_affected_assets"]),
+                            ", ".join(result["most_affecting_techniques"]), result.get("seed"), verbose=False)
+
+# Servicio de larga duración: mantiene el driver (y su pool de conexiones), la base de conocimiento y el
+# matriz de exposición del escenario entre peticiones. Cada petición abre una sesión ligera sobre el pool.
+def serve(host, port, pool_size):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    global serving
+    serving = True
+
+    knowledge_base = load_knowledge_base()
+    backend = start_backend(max_connection_pool_size=pool_size, connection_acquisition_timeout=30,
+                            max_connection_lifetime=3600, keep_alive=True)
+    state = {"exposure": load_exposure_matrix(backend, knowledge_base)}
+
+    class ArgosRequestHandler(BaseHTTPRequestHandler):
+        def reply(self, status, body):
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self.reply(200, {"status": "ok", "backend": backend.name, "assets": len(state["exposure"]["names"])})
+            else:
+                self.reply(404, {"error": "Ruta no encontrada"})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(request, dict):
+                    self.reply(400, {"error": "El cuerpo de la petición debe ser un objeto JSON"})
+                    return
+                if self.path == "/attack":
+                    # Como en attack, la semilla se elige si no se indica y se guarda con el identificador del
+                    # ataque, de modo que el ataque devuelto, el del grafo y el del historial son el mismo
+                    seed = request.get("seed")
+                    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool)):
+                        self.reply(400, {"error": "La semilla debe ser un número entero"})
+                        return
+                    if seed is None:
+                        seed = random.SystemRandom().randrange(2**31)
+                    result = run_attack(backend, knowledge_base, state["exposure"], request.get("start"), seed,
+                                        lateral=bool(request.get("lateral")), entry=request.get("entry"))
+                    result["seed"] = seed
+                    save_attack_result(result)
+                    # Sin base de datos el ataque solo vive en memoria: se descarta tras responder
+                    if backend.name == "offline":
+                        backend.discard(result["attack_id"])
+                    self.reply(200, result)
+                elif self.path == "/reload":
+                    # Volver a cargar los activos tras preparar otro escenario
+                    state["exposure"] = load_exposure_matrix(backend, knowledge_base)
+                    self.reply(200, {"assets": len(state["exposure"]["names"])})
+                else:
+                    self.reply(404, {"error": "Ruta no encontrada"})
+            except (ValueError, TypeError) as e:
+                self.reply(400, {"error": str(e)})
+            except Exception as e:
+                self.reply(500, {"error": str(e) or type(e).__name__})
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), ArgosRequestHandler)
+    print(f"\n[green][+][reset] Servicio ARGOS escuchando en http://{host}:{port} (backend {backend.name}, pool de {pool_size} conexiones).\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        backend.close()
+
+# Obtener el valor de una opción de la línea de comandos (p. ej. --runs 1000)
+def get_option(name, default=None, cast=str):
+    if name not in sys.argv:
+        return default
+    position = sys.argv.index(name)
+    try:
+        return cast(sys.argv[position + 1])
+    except (IndexError, ValueError):
+        print(f"[reset]Valor no válido para la opción {name}.")
+        exit(1)
+
 def help():
     print("[reset]TMT - Threat Modeling Tool")
     print("[blue]Autor:" + "[reset]\tSamuel García Sánchez")
@@ -602,11 +3252,31 @@ def help():
     print("[reset]\tpython3 tmt [generate|prepare <FILE>|attack|clean] [--help|-h]\n")
     print("[blue]COMMANDS:")
     print("[yellow]\tgenerate:" + "[reset]\tGenerar y mostrar secuencia de ataque.")
-    print("[yellow]\tprepare:" + "[reset]\tCargar escenario de red enviado como parámetro en Neo4j.")
-    print("[yellow]\tattack:" + "[reset]\t\tGenerar cadena de ataque y dirigirla al escenario creado.")
+    print("[yellow]\tprepare:" + "[reset]\tCargar escenario de red (.cypher, .json o .csv) enviado como parámetro en Neo4j por lotes (--batch N) y crear sus restricciones e índices (--check compara los planes PROFILE) y su matriz de exposición técnica-activo.")
+    print("[yellow]\tattack:" + "[reset]\t\tGenerar cadena de ataque y dirigirla al escenario creado (--seed S para reproducir un ataque del historial).")
     print("[yellow]\ttrace:" + "[reset]\t\tGenerar cadena de ataque a partir de una técnica inicial seleccionada manualmente por el usuario.")
-    print("[yellow]\thistory:" + "[reset]\tMostrar historial de ataques.")
-    print("[yellow]\tclean:" + "[reset]\t\tLimpiar base de datos.\n")
+    print("[reset]\t\t\tCon --json (y --start T en trace), el ataque se ejecuta sin dashboard y el resultado se escribe en JSON.")
+    print("[yellow]\tcampaign:" + "[reset]\tSimular N cadenas de ataque y mostrar estadísticas agregadas (--runs N --seed S --top K --batch B --graph --live --refresh Hz --json --ndjson --out DIR), o mostrar una campaña guardada (--load DIR).")
+    print("[yellow]\tparallel:" + "[reset]\tCampaña en paralelo sobre varios escenarios (.cypher, .json o .csv) con un pool de procesos (--runs N --seed S --workers W --chunk C).")
+    print("[yellow]\tconvert:" + "[reset]\tConvertir un escenario entre formatos (<ORIGEN> <DESTINO.json|DESTINO.csv>).")
+    print("[yellow]\tsynthesize:" + "[reset]\tGenerar un escenario sintético en JSON para pruebas de escala (<FILE.json> --assets N --seed S --links L --capabilities C --cve-ratio R).")
+    print("[yellow]\tanalyze:" + "[reset]\tCalcular de forma exacta pasos esperados, probabilidades de absorción y visitas por técnica (--start T --top K).")
+    print("[yellow]\tpaths:" + "[reset]\t\tMostrar los K caminos más probables hasta cada estado absorbente (--start T --to T --top K --max-steps N).")
+    print("[yellow]\toptimize:" + "[reset]\tElegir las K mitigaciones que más reducen el impacto en el escenario (--budget K --objective assets|severity|exploitations --runs N --seed S).")
+    print("[yellow]\tcompile:" + "[reset]\tCompilar la base de conocimiento (técnicas, CWE/CVE, mitigaciones y transiciones) en caché.")
+    print("[yellow]\tserve:" + "[reset]\t\tServicio HTTP local que reutiliza la conexión a Neo4j entre ataques (--host H --port P --pool-size N).")
+    print("[yellow]\thistory:" + "[reset]\tMostrar historial de ataques (--scenario E --asset A --technique T --since F --until F --min-severity G --limit N --page P --stats).")
+    print("[yellow]\tclean:" + "[reset]\t\tLimpiar base de datos por lotes (--batch N), o solo un ataque (--attack ID) o un escenario (--scenario E).\n")
+    print("[blue]PARÁMETROS:")
+    print("[yellow]\t--backend:" + "[reset]\tBackend de ejecución: neo4j (por defecto) u offline, que lee el escenario .cypher sin base de datos.")
+    print("[yellow]\t--no-db:" + "[reset]\tEquivalente a --backend offline.")
+    print("[yellow]\t--scenario:" + "[reset]\tEscenario, por nombre o por fichero: el que se usa en el modo sin base de datos (por defecto, el último preparado) o por el que filtran clean e history.")
+    print("[yellow]\t--uri, --user, --password:" + "[reset] Conexión a Neo4j (por defecto, variables ARGOS_NEO4J_URI/USER/PASSWORD o bolt://localhost:7687).")
+    print("[yellow]\t--lateral:" + "[reset]\tPropagar el ataque por las conexiones del escenario desde el activo --entry NAME (attack, trace).")
+    print("[yellow]\t--json:" + "[reset]\t\tSalida sin interfaz en JSON (attack, trace con --start T, campaign, paths, optimize); --ndjson en campaign.")
+    print("[yellow]\t--profile:" + "[reset]\tMostrar tiempo, memoria y contadores de cada fase al terminar (--profile-out F.prof|F.json para guardarlo).")
+    print("[yellow]\t--timing:" + "[reset]\tMostrar el tiempo y el número de consultas de escritura en Neo4j.")
+    print("[yellow]\t--help|-h:" + "[reset]\tMostrar ayuda y salir.\n")
  
 def main():
     
@@ -620,6 +3290,13 @@ def main():
         help()
         exit(0)
 
+    # Perfilado por fases: resumen al terminar el comando y, con --profile-out, volcado a .prof (cProfile) o .json (trazas)
+    if "--profile" in sys.argv or "--profile-out" in sys.argv:
+        import atexit
+        profile_out = get_option("--profile-out")
+        profiler.start(cprofile=bool(profile_out and profile_out.endswith(".prof")))
+        atexit.register(profiler.report, profile_out)
+
     if str(sys.argv[1]) == "prepare":
         
         if len(sys.argv) < 3:
@@ -627,30 +3304,154 @@ def main():
             exit(1)
         
         scenario_file = sys.argv[2]
-        driver = start_neo4j()
-        create_scenario_graph(driver, scenario_file)
-        close_neo4j(driver)
+        backend = start_backend()
+        with profiler.phase("carga del escenario"):
+            backend.load_scenario(scenario_file, get_option("--batch", 5000, int))
+        with profiler.phase("esquema"):
+            backend.create_schema(check="--check" in sys.argv)
+        if backend.name == "offline":
+            guardar_escenario(scenario_file)
+            print(f"\n[green][+][reset] Escenario '{current_scenario}' validado desde el fichero '{scenario_file}' (modo sin base de datos).\n")
+        # Matriz técnica-activo del escenario, reutilizada por attack, campaign y serve mientras no cambien
+        # la base de conocimiento ni los activos
+        with profiler.phase("matriz de exposición"):
+            start = time.perf_counter()
+            exposure = load_exposure_matrix(backend, load_knowledge_base(), scenario_file, rebuild=True)
+            print(f"[green][+][reset] Matriz de exposición del escenario: {len(exposure['masks']) - 1} técnicas × {len(exposure['names'])} activos"
+                  f" y {len(exposure['adjacency']['indices']) // 2} conexiones entre activos ({1000 * (time.perf_counter() - start):.0f} ms).\n")
+        backend.close()
         exit(0)
 
     elif str(sys.argv[1]) == "attack" or str(sys.argv[1]) == "trace":
-        techniques = load_techniques_json('tecnicas_completo.json')
-        cves = load_cves_json('ttp_cwe_cve.json')
-        cwes = load_cwes_json('ttp_cwe_cve.json')
-        chain = generate_markov_sequence(sys.argv[1], techniques)    
-        driver = start_neo4j()
-        create_attack_graph(driver, chain, techniques, cves, cwes)
-        link_attack_to_scenario(driver, chain, techniques, cves, cwes)
-        close_neo4j(driver)
+        # Semilla del ataque: se guarda en el historial para poder reproducirlo con --seed
+        seed = get_option("--seed", random.SystemRandom().randrange(2**31), int)
+        random.seed(seed)
+        knowledge_base = load_knowledge_base()
+        if "--json" in sys.argv:
+            if sys.argv[1] == "trace" and get_option("--start") is None:
+                print("[reset]En modo --json, trace necesita la técnica inicial con --start T.")
+                exit(1)
+            run_headless_attack(knowledge_base, seed, get_option("--start"), "--lateral" in sys.argv, get_option("--entry"))
+            exit(0)
+        techniques = knowledge_base["techniques"]
+        cves = knowledge_base["cves"]
+        cwes = knowledge_base["cwes"]
+        with profiler.phase("simulación"):
+            chain = generate_markov_sequence(sys.argv[1], knowledge_base)
+        backend = start_backend()
+        attack_id = new_attack_id()
+        create_attack_graph(backend, chain, techniques, cves, cwes, attack_id, timing="--timing" in sys.argv)
+        link_attack_to_scenario(backend, chain, techniques, cves, cwes, attack_id, seed, "--lateral" in sys.argv, get_option("--entry"))
+        backend.close()
+        exit(0)
+
+    elif str(sys.argv[1]) == "campaign":
+        runs = get_option("--runs", 1000, int)
+        seed = get_option("--seed", None, int)
+        top = get_option("--top", 10, int)
+        batch_size = get_option("--batch", 50000, int)
+        if runs < 1 or batch_size < 1:
+            print("[reset]Las opciones --runs y --batch deben ser al menos 1.")
+            exit(1)
+        refresh = get_option("--refresh", 4, float)
+        if refresh <= 0:
+            print("[reset]La opción --refresh debe ser mayor que 0.")
+            exit(1)
+        output = next((mode for mode in ("live", "json", "ndjson") if f"--{mode}" in sys.argv), "report")
+        if get_option("--load") is not None:
+            run_saved_campaign(get_option("--load"), top, "json" if output == "json" else "report")
+            exit(0)
+        run_campaign(runs, seed, top, graph="--graph" in sys.argv, timing="--timing" in sys.argv,
+                     batch_size=batch_size, output=output, refresh=refresh, out=get_option("--out"))
+        exit(0)
+
+    elif str(sys.argv[1]) == "parallel":
+        # Escenarios indicados tras el comando o, por defecto, todos los del directorio scenarios
+        scenario_files = [arg for arg in sys.argv[2:] if is_scenario_file(arg)]
+        if not scenario_files:
+            scenario_files = sorted(os.path.join("scenarios", f) for f in os.listdir("scenarios") if is_scenario_file(f))
+        runs = get_option("--runs", 100000, int)
+        seed = get_option("--seed", None, int)
+        workers = get_option("--workers", None, int)
+        chunk_size = get_option("--chunk", 50000, int)
+        if runs < 1 or chunk_size < 1:
+            fail("Las opciones --runs y --chunk deben ser al menos 1.\n")
+        top = get_option("--top", 3, int)
+        run_parallel_campaign(scenario_files, runs, seed, workers, chunk_size, top)
+        exit(0)
+
+    elif str(sys.argv[1]) == "convert":
+        if len(sys.argv) < 4:
+            print("[reset]Es necesario especificar el escenario de origen y el fichero de destino (.json o .csv).")
+            exit(1)
+        convert_scenario(sys.argv[2], sys.argv[3])
+        exit(0)
+
+    elif str(sys.argv[1]) == "synthesize":
+        if len(sys.argv) < 3 or not sys.argv[2].endswith(".json"):
+            print("[reset]Es necesario especificar el fichero .json del escenario a generar.")
+            exit(1)
+        write_generated_scenario(sys.argv[2], get_option("--assets", 1000, int), get_option("--seed", None, int),
+                                 get_option("--links", 2, float), get_option("--capabilities", 3, float),
+                                 get_option("--cve-ratio", 0.1, float))
+        exit(0)
+
+    elif str(sys.argv[1]) == "analyze":
+        start_state = get_option("--start")
+        top = get_option("--top", 10, int)
+        run_analysis(start_state, top)
+        exit(0)
+
+    elif str(sys.argv[1]) == "paths":
+        start_state = get_option("--start")
+        target = get_option("--to")
+        top = get_option("--top", 5, int)
+        max_steps = get_option("--max-steps", 30, int)
+        run_paths(start_state, target, top, max_steps, "json" if "--json" in sys.argv else "report")
+        exit(0)
+
+    elif str(sys.argv[1]) == "optimize":
+        budget = get_option("--budget", 3, int)
+        objective = get_option("--objective", "assets")
+        runs = get_option("--runs", 5000, int)
+        seed = get_option("--seed", None, int)
+        run_optimize(budget, objective, runs, seed, "json" if "--json" in sys.argv else "report")
+        exit(0)
+
+    elif str(sys.argv[1]) == "serve":
+        host = get_option("--host", "127.0.0.1")
+        port = get_option("--port", 7475, int)
+        pool_size = get_option("--pool-size", 50, int)
+        serve(host, port, pool_size)
+        exit(0)
+
+    elif str(sys.argv[1]) == "compile":
+        start = time.perf_counter()
+        compile_knowledge_base()
+        print(f"\n[green][+][reset] Base de conocimiento compilada en {KB_CACHE} ({1000 * (time.perf_counter() - start):.0f} ms).\n")
         exit(0)
 
     elif str(sys.argv[1]) == "clean":
-        driver = start_neo4j()
-        clean_database(driver)
-        close_neo4j(driver)
+        backend = start_backend()
+        scenario = get_option("--scenario")
+        backend.clean(get_option("--attack"), scenario and scenario_name(scenario), get_option("--batch", 10000, int))
+        backend.close()
         exit(0)
     
     elif str(sys.argv[1]) == "history":
-        display_attack_history_csv()
+        filters = {
+            "scenario": get_option("--scenario") and scenario_name(get_option("--scenario")),
+            "asset": get_option("--asset"),
+            "technique": get_option("--technique"),
+            "since": get_option("--since"),
+            "until": get_option("--until"),
+            "min_severity": get_option("--min-severity", None, int),
+        }
+        limit, page = get_option("--limit", 20, int), get_option("--page", 1, int)
+        if limit < 1 or page < 1:
+            print("[reset]Las opciones --limit y --page deben ser al menos 1.")
+            exit(1)
+        display_attack_history(filters, limit, page, "--stats" in sys.argv)
         exit(0)
 
     else:
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+
+# Benchmark de arranque en frío por comando: tiempo total del proceso y tiempo de importación
+# (python -X importtime), junto a los módulos de mayor coste importados por cada comando.
+#
+# Los comandos se ejecutan sobre una copia temporal de los ficheros de datos para no modificar
+# el historial ni el escenario actual del repositorio. Se usa el modo sin base de datos.
+#
+# Uso: python3 benchmarks/bench_startup.py [--repeat N] [--top K]
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_FILES = ['tecnicas_completo.json', 'ttp_cwe_cve.json', 'ttp_mitigations.json', 'transitions.csv',
+              'attack_history.csv', 'current_scenario.txt']
+
+COMMANDS = [
+    ["--help"],
+    ["history"],
+    ["clean", "--no-db"],
+    ["prepare", "scenarios/oficina.cypher", "--no-db"],
+    ["compile"],
+    ["analyze"],
+    ["campaign", "--no-db", "--runs", "1000", "--seed", "1"],
+]
+
+def get_option(name, default, cast=int):
+    if name in sys.argv:
+        return cast(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+# Ejecutar un comando y devolver (segundos, microsegundos de importación, {módulo: microsegundos})
+def run(command, workdir):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", os.path.join(ROOT, "argos.py")] + command,
+                            cwd=workdir, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split(":", 1)[1].split("|")
+        # Solo los módulos de primer nivel (sin sangría) acumulan el coste total
+        if not name.startswith("  "):
+            modules[name.strip()] = int(cumulative_us)
+    return elapsed, sum(modules.values()), modules
+
+def main():
+    repeat = get_option("--repeat", 5)
+    top = get_option("--top", 3)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for data_file in DATA_FILES:
+            shutil.copy(os.path.join(ROOT, data_file), workdir)
+        shutil.copytree(os.path.join(ROOT, "scenarios"), os.path.join(workdir, "scenarios"))
+
+        print(f"{'Comando':<45} {'Total (ms)':>10} {'Imports (ms)':>13}  Módulos más costosos")
+        for command in COMMANDS:
+            # Primera ejecución para generar la caché de bytecode y de la base de conocimiento
+            run(command, workdir)
+            best = min((run(command, workdir) for _ in range(repeat)), key=lambda r: r[0])
+            elapsed, imports_us, modules = best
+            heaviest = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:top]
+            heaviest = ", ".join(f"{name} {us / 1000:.0f}" for name, us in heaviest)
+            print(f"{' '.join(command):<45} {1000 * elapsed:>10.0f} {imports_us / 1000:>13.0f}  {heaviest}")
+
+if __name__ == "__main__":
+    main()
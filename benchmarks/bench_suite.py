@@ -0,0 +1,249 @@
+#!/usr/bin/python3
+
+# Suite de benchmarks de ARGOS con semillas fijas: simulación (pasos/s y cadenas/s), carga de los JSON
+# y de la base de conocimiento, correspondencia técnica-activo y optimización de mitigaciones sobre
+# escenarios sintéticos de tamaño creciente y escrituras en base de datos. Las escrituras se miden con
+# un sustituto local de Neo4j que registra las consultas (ida y vuelta al servidor) sin necesidad de un
+# servidor real. La base de conocimiento se compila en una caché temporal, sin tocar .argos_cache.
+#
+# Los resultados se pueden guardar con --save FICHERO.json y comparar con una ejecución anterior con
+# --compare FICHERO.json, marcando las métricas que empeoran más de --threshold por ciento.
+#
+# Uso: python3 benchmarks/bench_suite.py [--sizes 10,1000,10000,50000] [--seed S] [--repeat N]
+#                                        [--save F] [--compare F] [--threshold P]
+
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import numpy as np
+import argos
+
+# Sustituto de Neo4j: cuenta sesiones, transacciones y consultas, y devuelve los registros que esperan
+# las consultas de ARGOS (identificadores de nodos creados y activos del escenario)
+class RecordingDriver:
+    def __init__(self, assets=()):
+        self.assets = list(assets)
+        self.queries = 0
+        self.transactions = 0
+        self.rows = 0
+
+    def session(self, **kwargs):
+        return RecordingSession(self)
+
+    def close(self):
+        pass
+
+class Record(dict):
+    def data(self):
+        return dict(self)
+
+class RecordingTransaction:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def run(self, query, **parameters):
+        self.driver.queries += 1
+        self.driver.rows += sum(len(value) for value in parameters.values() if isinstance(value, list))
+        if "RETURN row.position" in query:
+            return [Record(position=row["position"], id=row["position"]) for row in parameters["rows"]]
+        if "RETURN a.name AS name" in query:
+            return [Record(asset) for asset in self.driver.assets]
+        return self
+
+    def consume(self):
+        return None
+
+    def __iter__(self):
+        return iter(())
+
+    def commit(self):
+        self.driver.transactions += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class RecordingSession(RecordingTransaction):
+    def begin_transaction(self):
+        return RecordingTransaction(self.driver)
+
+def get_option(name, default, cast=int):
+    if name in sys.argv:
+        return cast(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+# Mejor tiempo (s) de 'repeat' ejecuciones de fn
+def best_time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def quiet(fn, *args, **kwargs):
+    with redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+# Cada métrica: (nombre, valor, unidad, mayor_es_mejor)
+def bench_simulation(knowledge_base, seed, repeat):
+    model = knowledge_base["model"]
+    transitions = knowledge_base["transitions"]
+    start_state = sorted(transitions)[0]
+    steps = 100000
+
+    def walk(step):
+        state = start_state
+        for _ in range(steps):
+            state = step(state) or start_state
+
+    random.seed(seed)
+    reference = steps / best_time(lambda: walk(lambda state: argos.get_next_state(state, transitions)), repeat)
+    random.seed(seed)
+    alias = steps / best_time(lambda: walk(lambda state: argos.next_state(state, model)), repeat)
+
+    rng = random.Random(seed)
+    chains = 20000
+    starts = [model["states"][rng.choice(model["sources"])] for _ in range(chains)]
+    chain_rate = chains / best_time(lambda: [argos.simulate_chain(state, 30, model, rng=rng, verbose=False) for state in starts], repeat)
+    runs = 200000
+    campaign_rate = runs / best_time(lambda: argos.simulate_campaign(runs, model, np.random.default_rng(seed)), repeat)
+
+    return [
+        ("get_next_state", reference, "pasos/s", True),
+        ("next_state (tabla alias)", alias, "pasos/s", True),
+        ("simulate_chain", chain_rate, "cadenas/s", True),
+        ("simulate_campaign", campaign_rate, "cadenas/s", True),
+    ]
+
+def bench_loaders(repeat):
+    return [
+        ("load_techniques_json", 1000 * best_time(lambda: argos.load_techniques_json('tecnicas_completo.json'), repeat), "ms", False),
+        ("load_cves_json + load_cwes_json", 1000 * best_time(lambda: (argos.load_cves_json('ttp_cwe_cve.json'), argos.load_cwes_json('ttp_cwe_cve.json')), repeat), "ms", False),
+        ("load_mitigations_json", 1000 * best_time(lambda: argos.load_mitigations_json('ttp_mitigations.json'), repeat), "ms", False),
+        ("compile_knowledge_base", 1000 * best_time(argos.compile_knowledge_base, repeat), "ms", False),
+        ("load_knowledge_base (caché)", 1000 * best_time(lambda: (setattr(argos, "_knowledge_base", None), argos.load_knowledge_base()), repeat), "ms", False),
+    ]
+
+def bench_scenario(knowledge_base, size, seed, repeat):
+    techniques, cves, cwes = knowledge_base["techniques"], knowledge_base["cves"], knowledge_base["cwes"]
+    model = knowledge_base["model"]
+    scenario = argos.generate_scenario(size, seed)
+    graph = argos.structured_to_graph(scenario, f"sintetico-{size}")
+    assets = [node["properties"] for node in graph["nodes"]]
+    label = f"[{size} activos]"
+
+    # Inserción del escenario por lotes; la primera ejecución (calentamiento, incluye importar rich.progress)
+    # sirve para contar las consultas
+    driver = RecordingDriver()
+    quiet(argos.write_scenario_batches, driver, graph)
+    load_round_trips = driver.queries
+    load_time = best_time(lambda: quiet(argos.write_scenario_batches, RecordingDriver(), graph), repeat)
+
+    # Correspondencia técnica-activo
+    index_time = best_time(lambda: argos.build_asset_index(assets), repeat)
+    asset_index = argos.build_asset_index(assets)
+    match_time = best_time(lambda: [argos.match_technique_assets(asset_index, state, techniques, cves) for state in model["states"]], repeat)
+    links = [(assets[link["source"]]["name"], assets[link["target"]]["name"]) for link in graph["links"]]
+    exposure_time = best_time(lambda: argos.build_exposure_matrix(assets, knowledge_base, links), repeat)
+    exposure = argos.build_exposure_matrix(assets, knowledge_base, links)
+
+    # Un ataque completo con semilla fija: escritura de la cadena y de las explotaciones, con un sustituto
+    # nuevo en cada ejecución; la primera (calentamiento) sirve para contar las consultas
+    chain = argos.simulate_chain(sorted(knowledge_base["transitions"])[0], 30, model, rng=random.Random(seed), verbose=False)
+
+    def attack(driver):
+        backend = argos.Neo4jBackend(driver)
+        attack_id = argos.new_attack_id()
+        quiet(argos.create_attack_graph, backend, chain, techniques, cves, cwes, attack_id)
+        backend.load_assets()
+        affected_assets, affecting_techniques_ids, _ = argos.exposed_attack_assets(exposure, chain, model, techniques)
+        backend.write_exploitation_edges(list(zip(affected_assets, affecting_techniques_ids)), attack_id, f"sintetico-{size}")
+
+    driver = RecordingDriver(assets)
+    attack(driver)
+    attack_time = best_time(lambda: attack(RecordingDriver(assets)), repeat)
+    lateral_time = best_time(lambda: argos.lateral_attack_assets(exposure, chain, model, techniques, assets[0]["name"]), repeat)
+
+    # Impacto de una campaña sobre el escenario
+    chains, _, _ = argos.simulate_campaign(20000, model, np.random.default_rng(seed))
+    impact_rate = len(chains) / best_time(lambda: argos.campaign_impact(chains, exposure), repeat)
+
+    # Optimización de mitigaciones: conjuntos evaluados por segundo sobre una muestra fija de cadenas
+    evaluate = argos.mitigation_evaluator("severity", model, exposure, 5000, seed)
+    candidates = argos.mitigation_candidates(knowledge_base["mitigation_targets"], model)
+    evaluations = argos.optimize_mitigations(candidates, evaluate, len(model["states"]), 3)["evaluations"]
+    optimize_rate = evaluations / best_time(lambda: argos.optimize_mitigations(candidates, evaluate, len(model["states"]), 3), repeat)
+
+    return [
+        (f"write_scenario_batches {label}", (len(graph["nodes"]) + len(graph["links"])) / load_time, "elementos/s", True),
+        (f"write_scenario_batches {label}", load_round_trips, "consultas", False),
+        (f"build_asset_index {label}", 1000 * index_time, "ms", False),
+        (f"match_technique_assets {label}", 1e6 * match_time / len(model["states"]), "µs/técnica", False),
+        (f"build_exposure_matrix {label}", 1000 * exposure_time, "ms", False),
+        (f"ataque (escritura y correspondencia) {label}", 1000 * attack_time, "ms", False),
+        (f"ataque (escritura y correspondencia) {label}", driver.queries, "consultas", False),
+        (f"lateral_attack_assets {label}", 1000 * lateral_time, "ms", False),
+        (f"campaign_impact {label}", impact_rate, "cadenas/s", True),
+        (f"optimize_mitigations {label}", optimize_rate, "conjuntos/s", True),
+    ]
+
+def main():
+    sizes = [int(size) for size in get_option("--sizes", "10,1000,10000,50000", str).split(",")]
+    seed = get_option("--seed", 1)
+    repeat = get_option("--repeat", 3)
+    threshold = get_option("--threshold", 20, float)
+    save_file = get_option("--save", None, str)
+    compare_file = get_option("--compare", None, str)
+
+    # La base de conocimiento se compila en una caché temporal para no sobrescribir la del repositorio
+    kb_cache = argos.KB_CACHE
+    with tempfile.TemporaryDirectory() as cache_dir:
+        argos.KB_CACHE = os.path.join(cache_dir, "knowledge_base.pickle")
+        try:
+            knowledge_base = argos.load_knowledge_base()
+            results = bench_simulation(knowledge_base, seed, repeat) + bench_loaders(repeat)
+            argos._knowledge_base = knowledge_base
+            for size in sizes:
+                results += bench_scenario(knowledge_base, size, seed, repeat)
+        finally:
+            argos.KB_CACHE = kb_cache
+
+    previous = {}
+    if compare_file:
+        with open(compare_file, encoding="utf-8") as file:
+            previous = {(entry["name"], entry["unit"]): entry["value"] for entry in json.load(file)}
+
+    print(f"{'Métrica':<62} {'Valor':>14} {'Unidad':<12} {'Cambio':>9}")
+    regressions = 0
+    for name, value, unit, higher_is_better in results:
+        change = ""
+        if (name, unit) in previous and previous[(name, unit)]:
+            delta = 100 * (value - previous[(name, unit)]) / previous[(name, unit)]
+            worse = -delta if higher_is_better else delta
+            change = f"{delta:+.1f}%" + (" !" if worse > threshold else "")
+            regressions += worse > threshold
+        print(f"{name:<62} {value:>14,.1f} {unit:<12} {change:>9}")
+
+    if save_file:
+        with open(save_file, "w", encoding="utf-8") as file:
+            json.dump([{"name": name, "value": value, "unit": unit, "higher_is_better": higher}
+                       for name, value, unit, higher in results], file, ensure_ascii=False, indent=2)
+    if compare_file:
+        print(f"\n{regressions} métricas empeoran más de un {threshold:.0f}% respecto a {compare_file}.")
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+
+# Microbenchmark del muestreo de transiciones: pasos por segundo con get_next_state (listas de tuplas
+# y random.choices), con next_state (tablas alias compiladas) y con el muestreo vectorizado de campaign.
+#
+# Uso: python3 benchmarks/bench_transitions.py [--steps N] [--seed S]
+
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import numpy as np
+import argos
+
+def steps_per_second(step, start_state, steps):
+    state = start_state
+    begin = time.perf_counter()
+    for _ in range(steps):
+        state = step(state) or start_state
+    return steps / (time.perf_counter() - begin)
+
+def main():
+    steps = argos.get_option("--steps", 200000, int)
+    seed = argos.get_option("--seed", 1, int)
+
+    transitions = argos.load_transitions('transitions.csv')
+    argos.compile_transitions(transitions)  # Calentamiento: importación diferida de scipy
+    begin = time.perf_counter()
+    model = argos.compile_transitions(transitions)
+    compile_ms = 1000 * (time.perf_counter() - begin)
+    start_state = sorted(transitions)[0]
+
+    random.seed(seed)
+    before = steps_per_second(lambda state: argos.get_next_state(state, transitions), start_state, steps)
+    random.seed(seed)
+    after = steps_per_second(lambda state: argos.next_state(state, model), start_state, steps)
+
+    # Muestreo vectorizado: un paso para muchas cadenas a la vez
+    rng = np.random.default_rng(seed)
+    current = model["sources"][rng.integers(0, len(model["sources"]), size=steps)]
+    begin = time.perf_counter()
+    argos.sample_next_states(current, model, rng)
+    vectorized = steps / (time.perf_counter() - begin)
+
+    print(f"Compilación del modelo:             {compile_ms:10.1f} ms ({len(model['indices'])} transiciones, {len(model['states'])} técnicas)")
+    print(f"get_next_state (random.choices):    {before:14,.0f} pasos/s")
+    print(f"next_state (tabla alias):           {after:14,.0f} pasos/s ({after / before:.1f}x)")
+    print(f"sample_next_states (vectorizado):   {vectorized:14,.0f} pasos/s ({vectorized / before:.1f}x)")
+
+if __name__ == "__main__":
+    main()